@@ -0,0 +1,313 @@
+"""
+Storage for converted attempt audio.
+
+The 16kHz mono WAV that Azure graded is kept so that attempts (or single words)
+can be replayed without the client holding its own copy. Audio stays as
+uncompressed 16-bit PCM so any word window is a plain byte range of the file.
+Each attempt has a small JSON sidecar with its owner, word timings and the
+location of the PCM data.
+
+Two backends:
+- Local directory (uvicorn / local development): ranges are served straight
+  out of a memory map, and the least recently used attempts are evicted once
+  the store grows past ATTEMPT_AUDIO_MAX_BYTES.
+- S3 (Lambda): set ATTEMPT_AUDIO_BUCKET. Lambda's /tmp is private to each
+  container, so a local store would not survive across invocations. Ranges are
+  fetched with ranged GetObject calls and retention is handled by the bucket's
+  lifecycle rule. On Lambda without a bucket, attempt audio is not stored.
+"""
+
+import os
+import re
+import json
+import mmap
+import uuid
+import shutil
+import logging
+import struct
+import tempfile
+import threading
+from typing import Iterator, Optional
+
+# boto3 ships with the Lambda runtime; it is only needed for the S3 backend
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+
+STORE_DIR = os.getenv("ATTEMPT_AUDIO_DIR", os.path.join(tempfile.gettempdir(), "attempt_audio"))
+MAX_STORE_BYTES = int(os.getenv("ATTEMPT_AUDIO_MAX_BYTES", str(200 * 1024 * 1024)))
+
+BUCKET = os.getenv("ATTEMPT_AUDIO_BUCKET")
+S3_PREFIX = "attempts/"
+
+IS_LAMBDA = bool(os.environ.get("AWS_LAMBDA_FUNCTION_NAME"))
+STORE_ENABLED = bool(BUCKET) or not IS_LAMBDA
+
+# Lambda buffers the whole response and caps it at 6 MB after base64 encoding,
+# so S3-backed responses are limited to this many bytes per request
+S3_MAX_RESPONSE_BYTES = 3 * 1024 * 1024
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Azure reports word timings in 100-nanosecond units
+TICKS_PER_SECOND = 10000000
+
+# Size of each chunk when streaming stored audio
+STREAM_CHUNK_BYTES = 64 * 1024
+
+ATTEMPT_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+# Running total of the local store's size; None until the first scan
+_store_bytes = None
+
+_s3_client = None
+
+
+def _audio_path(attempt_id: str) -> str:
+    return os.path.join(STORE_DIR, f"{attempt_id}.wav")
+
+
+def _meta_path(attempt_id: str) -> str:
+    return os.path.join(STORE_DIR, f"{attempt_id}.json")
+
+
+def _s3():
+    """Returns the shared S3 client, creating it on first use."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client("s3")
+    return _s3_client
+
+
+def _scan_store() -> list:
+    """List local attempts as (mtime, size, attempt_id). Caller holds _lock."""
+    entries = []
+    for name in os.listdir(STORE_DIR):
+        if not name.endswith(".wav"):
+            continue
+        stat = os.stat(os.path.join(STORE_DIR, name))
+        entries.append((stat.st_mtime, stat.st_size, name[:-4]))
+    return entries
+
+
+def _evict():
+    """
+    Delete least recently used attempts until the store fits MAX_STORE_BYTES.
+    The directory is only rescanned when the running total says it is over. Caller holds _lock.
+    """
+    global _store_bytes
+    if _store_bytes is not None and _store_bytes <= MAX_STORE_BYTES:
+        return
+
+    entries = _scan_store()
+    _store_bytes = sum(size for _, size, _ in entries)
+    for _, size, attempt_id in sorted(entries):
+        if _store_bytes <= MAX_STORE_BYTES:
+            break
+        for path in (_audio_path(attempt_id), _meta_path(attempt_id)):
+            if os.path.exists(path):
+                os.unlink(path)
+        _store_bytes -= size
+
+
+def find_data_chunk(header: bytes, file_size: int) -> tuple:
+    """
+    Return (offset, size) of the PCM `data` chunk of a RIFF/WAV file, given the
+    start of the file. The size is clamped to what the file actually holds.
+    """
+    position = 12  # Skip "RIFF", file size and "WAVE"
+    while position + 8 <= len(header):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", header, position)
+        if chunk_id == b"data":
+            return position + 8, min(chunk_size, file_size - position - 8)
+        position += 8 + chunk_size + (chunk_size % 2)
+    raise ValueError("WAV file has no data chunk")
+
+
+def save_attempt(wav_path: str, scores: dict, owner: str = None) -> Optional[str]:
+    """
+    Move a converted WAV file into the store and record its word timings.
+    Blocking (file moves or S3 uploads); call it from a worker thread.
+
+    Args:
+        wav_path: Path to the 16kHz mono WAV that was graded (moved, not copied)
+        scores: Result from get_pronunciation_score_async() or get_passage_score_async()
+        owner: Cognito `sub` of the user who made the attempt, if known
+
+    Returns the new attempt ID, or None if the audio was not stored.
+    """
+    global _store_bytes
+    if not STORE_ENABLED:
+        return None
+
+    attempt_id = uuid.uuid4().hex
+    try:
+        size = os.path.getsize(wav_path)
+        with open(wav_path, "rb") as wav_file:
+            data_offset, data_size = find_data_chunk(wav_file.read(4096), size)
+    except (OSError, ValueError, struct.error):
+        logger.exception("Failed to store attempt audio")
+        return None
+
+    meta = json.dumps({
+        "owner": owner,
+        "size": size,
+        "data_offset": data_offset,
+        "data_size": data_size,
+        "words": [
+            {"word": w.get("word", ""), "offset": w.get("offset"), "duration": w.get("duration")}
+            for w in (scores.get("azure_debug") or {}).get("words", [])
+        ],
+    })
+
+    if BUCKET:
+        try:
+            _s3().upload_file(wav_path, BUCKET, f"{S3_PREFIX}{attempt_id}.wav",
+                              ExtraArgs={"ContentType": "audio/wav"})
+            _s3().put_object(Bucket=BUCKET, Key=f"{S3_PREFIX}{attempt_id}.json",
+                             Body=meta.encode(), ContentType="application/json")
+        except Exception:
+            logger.exception("Failed to store attempt audio")
+            return None
+        return attempt_id
+
+    try:
+        with _lock:
+            os.makedirs(STORE_DIR, exist_ok=True)
+            shutil.move(wav_path, _audio_path(attempt_id))
+            with open(_meta_path(attempt_id), "w") as meta_file:
+                meta_file.write(meta)
+            if _store_bytes is not None:
+                _store_bytes += size
+            _evict()
+    except OSError:
+        logger.exception("Failed to store attempt audio")
+        return None
+
+    return attempt_id if os.path.exists(_audio_path(attempt_id)) else None
+
+
+def get_attempt(attempt_id: str) -> Optional[dict]:
+    """
+    Look up a stored attempt (and, locally, mark it as recently used).
+    Blocking; call it from a worker thread.
+
+    Returns {"id", "owner", "size", "data_offset", "data_size", "words"},
+    or None if it is unknown or evicted.
+    """
+    if not STORE_ENABLED or not ATTEMPT_ID_PATTERN.fullmatch(attempt_id):
+        return None
+
+    if BUCKET:
+        try:
+            response = _s3().get_object(Bucket=BUCKET, Key=f"{S3_PREFIX}{attempt_id}.json")
+            meta = json.loads(response["Body"].read())
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") != "NoSuchKey":
+                logger.exception("Failed to read attempt metadata")
+            return None
+    else:
+        with _lock:
+            try:
+                with open(_meta_path(attempt_id)) as meta_file:
+                    meta = json.load(meta_file)
+                os.utime(_audio_path(attempt_id))
+            except (OSError, ValueError):
+                return None
+
+    return {
+        "id": attempt_id,
+        "owner": meta.get("owner"),
+        "size": meta["size"],
+        "data_offset": meta["data_offset"],
+        "data_size": meta["data_size"],
+        "words": meta.get("words", []),
+    }
+
+
+def max_response_bytes() -> Optional[int]:
+    """Largest body a single audio response may carry, or None if unlimited."""
+    return S3_MAX_RESPONSE_BYTES if BUCKET else None
+
+
+def presigned_audio_url(attempt: dict, expires_in: int = 300) -> Optional[str]:
+    """Short-lived S3 URL for the full recording, or None for the local store."""
+    if not BUCKET:
+        return None
+    return _s3().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": BUCKET, "Key": f"{S3_PREFIX}{attempt['id']}.wav"},
+        ExpiresIn=expires_in
+    )
+
+
+def _map_audio(attempt_id: str) -> mmap.mmap:
+    """
+    Memory-map a stored WAV file read-only.
+
+    The file descriptor is closed immediately; the mapping itself stays valid
+    until the last memoryview slice of it is released, so it can safely back a
+    streaming response even if the file is evicted mid-request.
+    """
+    with open(_audio_path(attempt_id), "rb") as audio_file:
+        return mmap.mmap(audio_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def open_audio_range(attempt: dict, start: int, end: int) -> Iterator:
+    """
+    Open bytes [start, end) of an attempt's WAV file for streaming.
+
+    Locally this yields zero-copy memoryview slices of a memory map; on S3 it
+    streams a ranged GetObject. The file is opened before returning, so a
+    missing file raises OSError (or the S3 client error) here rather than
+    mid-response.
+    """
+    if BUCKET:
+        response = _s3().get_object(
+            Bucket=BUCKET,
+            Key=f"{S3_PREFIX}{attempt['id']}.wav",
+            Range=f"bytes={start}-{end - 1}"
+        )
+        return response["Body"].iter_chunks(STREAM_CHUNK_BYTES)
+
+    view = memoryview(_map_audio(attempt["id"]))[start:end]
+    return (view[position:position + STREAM_CHUNK_BYTES] for position in range(0, len(view), STREAM_CHUNK_BYTES))
+
+
+def word_byte_range(attempt: dict, word_index: int) -> Optional[tuple]:
+    """
+    Convert a word's offset/duration (100ns ticks) into a [start, end) byte range
+    of the WAV file, clamped to the PCM data. Returns None if the word has no
+    timing or falls outside the recorded audio.
+    """
+    word = attempt["words"][word_index]
+    if word.get("offset") is None or word.get("duration") is None:
+        return None
+
+    data_offset = attempt["data_offset"]
+    data_size = attempt["data_size"]
+    start_frame = word["offset"] * SAMPLE_RATE // TICKS_PER_SECOND
+    end_frame = (word["offset"] + word["duration"]) * SAMPLE_RATE // TICKS_PER_SECOND
+    start = min(start_frame * SAMPLE_WIDTH, data_size)
+    end = min(end_frame * SAMPLE_WIDTH, data_size)
+    if end <= start:
+        return None
+    return data_offset + start, data_offset + end
+
+
+def wav_header(data_size: int) -> bytes:
+    """Build a 44-byte PCM WAV header for `data_size` bytes of 16kHz mono 16-bit audio."""
+    byte_rate = SAMPLE_RATE * SAMPLE_WIDTH
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, 1, SAMPLE_RATE, byte_rate, SAMPLE_WIDTH, SAMPLE_WIDTH * 8,
+        b"data", data_size
+    )
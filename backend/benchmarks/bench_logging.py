@@ -0,0 +1,237 @@
+"""
+Benchmark the cost of request logging on the real /api/analyze endpoint.
+
+Drives main.app in-process through httpx's ASGITransport with many concurrent
+analyze requests, so every request goes through routing, multipart parsing,
+the RequestLoggingMiddleware and the analyze handler.
+Conversion, Azure grading, OpenAI coaching and the attempt store are replaced
+by stubs (grading and coaching await a fixed delay), so only the app's own
+overhead varies between modes:
+
+    bare    RequestLoggingMiddleware removed, logging disabled
+    off     middleware installed, logging disabled (logger calls are no-ops)
+    sync    middleware installed, JSON records written on the request path
+    queue   middleware installed, request_logging.configure_logging()
+            (queue-backed, formatted and written on the listener thread)
+
+Log output goes to a sink that sleeps on every write to mimic a slow stdout
+pipe (1 ms per write stands in for a congested CloudWatch pipe). Each mode
+runs in a fresh interpreter; the median of --repeat runs is reported.
+
+Results on one shared vCPU (Python 3.11), 2000 requests x 5 at concurrency 50,
+5 ms per stubbed upstream call, latency end to end per request. Run-to-run
+noise on this machine is around +/-10%, so bare and off are indistinguishable,
+and neither depends on the sink:
+
+       sink   mode    req/s   p50 (ms)   p99 (ms)  records
+       0 us   bare      412      101.7      178.6        0
+       0 us    off      379      114.3      185.8        0
+       0 us   sync      328      130.5      222.4     2000
+       0 us  queue      338      127.4      211.1     2000
+    1000 us   bare      365      118.6      212.9        0
+    1000 us    off      309      138.8      222.0        0
+    1000 us   sync      208      208.8      297.8     2000
+    1000 us  queue      302      145.5      261.3     2000
+
+Each request emits a single JSON record ("Request completed", carrying the
+analyze stage timings), without thread, process or caller lookups. With a fast
+sink that still costs roughly 10% of throughput in either mode. With a slow
+sink, writing on the request path loses about a third of throughput, while the
+queue stays within noise of no logging: blocked writes no longer stall the
+event loop, and formatting one record on the listener thread is cheap.
+
+Usage (from backend/):
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --requests 5000 --concurrency 100 --sink-latency-us 0 100
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ("bare", "off", "sync", "queue")
+
+REFERENCE_TEXT = "The quick brown fox jumps over the lazy dog"
+
+
+class SlowSink:
+    """File-like object that discards data after a fixed delay per write."""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def stub_engines(main, upstream_s: float):
+    """Replace conversion, grading, coaching and storage in main with cheap stand-ins."""
+
+    def convert_to_wav(input_path, output_path):
+        with open(output_path, "wb") as wav_file:
+            wav_file.write(b"\0" * 44)
+        return True
+
+    async def get_pronunciation_score_async(wav_path, reference_text, strictness=3):
+        await asyncio.sleep(upstream_s)
+        words = [
+            {"word": word, "accuracy": 90, "error_type": "None", "offset": i * 5000000, "duration": 4000000}
+            for i, word in enumerate(reference_text.split())
+        ]
+        return {"pronunciation": 90, "fluency": 90, "completeness": 100, "azure_debug": {"words": words}}
+
+    async def get_coaching_tips_async(reference_text, scores):
+        await asyncio.sleep(upstream_s)
+        return ["Keep going."]
+
+    main.convert_to_wav = convert_to_wav
+    main.get_pronunciation_score_async = get_pronunciation_score_async
+    main.get_coaching_tips_async = get_coaching_tips_async
+    main.save_attempt = lambda wav_path, scores, owner=None: uuid.uuid4().hex
+
+
+def configure_mode(main, mode: str, sink: SlowSink):
+    import request_logging
+
+    request_logging.shutdown_logging()
+    root = logging.getLogger()
+    root.handlers = []
+
+    if mode == "bare":
+        main.app.user_middleware = [m for m in main.app.user_middleware if m.cls is not main.RequestLoggingMiddleware]
+        logging.disable(logging.CRITICAL)
+    elif mode == "off":
+        logging.disable(logging.CRITICAL)
+    elif mode == "sync":
+        # Skip the same unused record attributes configure_logging() does
+        logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+        logging.logAsyncioTasks = False
+        logging._srcfile = None
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(request_logging.JsonFormatter())
+        handler.addFilter(_ContextFilter())
+        root.handlers = [handler]
+        root.setLevel(logging.INFO)
+    else:
+        request_logging.configure_logging(stream=sink)
+
+
+class _ContextFilter(logging.Filter):
+    """Adds request context for the synchronous handler, as ContextQueueHandler does."""
+
+    def filter(self, record):
+        import request_logging
+        record.request_id = request_logging.request_id_var.get()
+        record.user_sub = request_logging.user_sub_var.get()
+        return True
+
+
+async def drive(app, requests: int, concurrency: int) -> list:
+    """Send `requests` analyze requests, `concurrency` at a time; returns per-request latencies."""
+    import httpx
+
+    audio = b"\x1aE\xdf\xa3" + bytes(8192)  # Contents are irrelevant to the stubbed conversion
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/api/analyze",
+                    files={"audio": ("recording.webm", audio, "audio/webm")},
+                    data={"reference_text": REFERENCE_TEXT},
+                )
+                response.raise_for_status()
+                return time.perf_counter() - start
+
+        return await asyncio.gather(*(one() for _ in range(requests)))
+
+
+def run_worker(mode: str, args):
+    """Run one mode in this process and print its measurements as JSON."""
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+    import request_logging
+
+    sink = SlowSink(args.sink_latency_us / 1e6)
+    stub_engines(main, args.upstream_ms / 1000)
+    configure_mode(main, mode, sink)
+
+    # httpx logs every client request at INFO; only the app's records should count
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    asyncio.run(drive(main.app, min(200, args.requests), args.concurrency))  # Warm up
+    request_logging.flush_logs(timeout=30)
+    sink.writes = 0
+
+    runs = []
+    for _ in range(args.repeat):
+        sink.writes = 0
+        start = time.perf_counter()
+        latencies = sorted(asyncio.run(drive(main.app, args.requests, args.concurrency)))
+        wall = time.perf_counter() - start
+        request_logging.flush_logs(timeout=30)
+        runs.append({
+            "requests_per_s": args.requests / wall,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            "records": sink.writes,
+        })
+
+    # Report the median run by throughput; single runs on a shared CPU are noisy
+    print(json.dumps(sorted(runs, key=lambda run: run["requests_per_s"])[len(runs) // 2]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--upstream-ms", type=float, default=5.0)
+    parser.add_argument("--sink-latency-us", type=float, nargs="+", default=[0.0, 1000.0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--worker", metavar="MODE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.sink_latency_us = args.sink_latency_us[0]
+        run_worker(args.worker, args)
+        return
+
+    print(f"{args.requests} requests x {args.repeat}, concurrency {args.concurrency}, "
+          f"{args.upstream_ms:.0f} ms per upstream call")
+    print(f"{'sink':>8} {'mode':>6} {'req/s':>8} {'p50 (ms)':>10} {'p99 (ms)':>10} {'records':>8}")
+    env = dict(os.environ, AZURE_SPEECH_KEY="", OPENAI_API_KEY="", LOG_SAMPLE_RATES="")
+    for sink_latency_us in args.sink_latency_us:
+        for mode in MODES:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", mode,
+                 "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                 "--upstream-ms", str(args.upstream_ms), "--sink-latency-us", str(sink_latency_us),
+                 "--repeat", str(args.repeat)],
+                capture_output=True, text=True, check=True, env=env, cwd=BACKEND_DIR
+            )
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f"{sink_latency_us:>5.0f} us {mode:>6} {result['requests_per_s']:>8.0f} {result['p50_ms']:>10.1f} "
+                  f"{result['p99_ms']:>10.1f} {result['records']:>8}")
+
+
+if __name__ == "__main__":
+    main()
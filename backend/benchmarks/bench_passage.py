@@ -0,0 +1,134 @@
+"""
+Benchmark peak RSS and wall time of audio conversion for long recordings.
+
+Compares the in-memory pydub conversion used for single sentences
+(main.convert_to_wav) with the streaming conversion used by passage mode
+(passage_engine.stream_convert_to_wav, which also detects silences) on
+synthetic 1, 5 and 10 minute webm/opus recordings. Both modes time only the
+webm -> 16kHz WAV step; grading is network-bound and identical either way.
+The 5 and 10 minute inputs exercise local/uvicorn use: deployed, /api/analyze
+rejects passages longer than passage_engine.MAX_PASSAGE_MS (90 s by default).
+
+Each measurement runs in a fresh interpreter so peak RSS is not polluted by
+earlier runs. Peak RSS is for the Python process only; ffmpeg runs as a
+separate process in both modes and is not included. Requires ffmpeg (and
+ffprobe, which pydub uses).
+
+Results on one vCPU with a static ffmpeg 7.0.2 (Python 3.11):
+
+     input     mode   wall (s)  peak RSS (MB)
+       1 m   legacy       0.31           75.5
+       1 m  passage       0.29           59.1
+       5 m   legacy       1.65          142.0
+       5 m  passage       1.35           59.1
+      10 m   legacy       2.86          225.2
+      10 m  passage       2.56           59.2
+
+Usage (from backend/):
+    python benchmarks/bench_passage.py
+    python benchmarks/bench_passage.py --minutes 1 5
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import wave
+import random
+import struct
+import argparse
+import resource
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Browser recordings are typically 48kHz opus in webm
+SOURCE_RATE = 48000
+
+
+def make_recording(path: str, minutes: int):
+    """Write a webm file of tone bursts separated by pauses, roughly shaped like read speech."""
+    wav_path = path.replace(".webm", ".wav")
+    rng = random.Random(minutes)
+    total_samples = minutes * 60 * SOURCE_RATE
+    written = 0
+    with wave.open(wav_path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SOURCE_RATE)
+        while written < total_samples:
+            # ~3s "sentence" followed by a ~0.6s pause
+            burst = int(SOURCE_RATE * rng.uniform(2.0, 4.0))
+            pause = int(SOURCE_RATE * rng.uniform(0.4, 0.8))
+            frequency = rng.uniform(120, 240)
+            samples = [int(8000 * math.sin(2 * math.pi * frequency * i / SOURCE_RATE)) for i in range(burst)]
+            samples += [0] * pause
+            samples = samples[:total_samples - written]
+            wav_file.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+            written += len(samples)
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", wav_path, "-c:a", "libopus", path],
+        check=True
+    )
+    os.unlink(wav_path)
+
+
+def run_worker(mode: str, input_path: str):
+    """Run one conversion in this process and print its measurements as JSON."""
+    sys.path.insert(0, BACKEND_DIR)
+    output_path = input_path.replace(".webm", f"_{mode}.wav")
+
+    # Import the whole app in both modes so the baseline RSS is the same
+    import main
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        ok = main.convert_to_wav(input_path, output_path)
+    else:
+        ok = main.stream_convert_to_wav(input_path, output_path) is not None
+    elapsed = time.perf_counter() - start
+
+    if os.path.exists(output_path):
+        os.unlink(output_path)
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    print(json.dumps({
+        "ok": ok,
+        "seconds": elapsed,
+        "python_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "INPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, input_path = args.worker
+        run_worker(mode, input_path)
+        return
+
+    print(f"{'input':>8} {'mode':>8} {'wall (s)':>10} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for minutes in args.minutes:
+            input_path = os.path.join(workdir, f"recording_{minutes}m.webm")
+            make_recording(input_path, minutes)
+            for mode in ("legacy", "passage"):
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", mode, input_path],
+                    capture_output=True, text=True, check=True
+                )
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                if not result["ok"]:
+                    print(f"{minutes:>6} m {mode:>8} conversion failed")
+                    continue
+                print(f"{minutes:>6} m {mode:>8} {result['seconds']:>10.2f} {result['python_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import os
-from openai import OpenAI, RateLimitError, APIError as OpenAIAPIError, AuthenticationError
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIError as OpenAIAPIError, AuthenticationError
 
 
 class CoachingAPIError(Exception):
@@ -11,17 +11,24 @@ class CoachingAPIError(Exception):
         super().__init__(self.message)
 
 
-def get_coaching_tips(reference_text: str, scores: dict) -> str:
-    """
-    Uses LLM to generate feedback based on scores.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    
-    if not api_key:
-        return "**Demo Mode:** Great effort! Your pronunciation scores look good. To get personalized coaching tips, add an OpenAI API key to your environment."
+DEMO_MODE_TIPS = "**Demo Mode:** Great effort! Your pronunciation scores look good. To get personalized coaching tips, add an OpenAI API key to your environment."
 
-    client = OpenAI(api_key=api_key)
+# Shared async client so concurrent requests reuse one pooled set of connections
+_async_client = None
+_async_client_key = None
+
+
+def _get_async_client(api_key: str) -> AsyncOpenAI:
+    """Returns the process-wide AsyncOpenAI client, creating it on first use."""
+    global _async_client, _async_client_key
+    if _async_client is None or _async_client_key != api_key:
+        _async_client = AsyncOpenAI(api_key=api_key)
+        _async_client_key = api_key
+    return _async_client
 
+
+def _build_prompt(reference_text: str, scores: dict) -> str:
+    """Builds the coaching prompt from the reference text and scores."""
     prompt = f"""
     You are an expert American English Dialect Coach - warm, encouraging, and specific.
     
@@ -37,14 +44,15 @@ def get_coaching_tips(reference_text: str, scores: dict) -> str:
     5. Use markdown formatting for readability.
     6. Keep it concise (under 150 words).
     """
+    return prompt
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content
-    except RateLimitError as e:
+
+def _handle_coaching_error(e: Exception) -> str:
+    """
+    Raises CoachingAPIError for rate limit, quota, auth and service errors.
+    Returns a fallback message for anything else.
+    """
+    if isinstance(e, RateLimitError):
         error_msg = str(e)
         # Check if it's a quota exceeded error vs rate limit
         if "quota" in error_msg.lower() or "exceeded" in error_msg.lower() or "billing" in error_msg.lower():
@@ -59,13 +67,13 @@ def get_coaching_tips(reference_text: str, scores: dict) -> str:
                 "rate_limit",
                 error_msg
             )
-    except AuthenticationError as e:
+    elif isinstance(e, AuthenticationError):
         raise CoachingAPIError(
             "OpenAI API authentication failed. Please contact the app administrator.",
             "auth_error",
             str(e)
         )
-    except OpenAIAPIError as e:
+    elif isinstance(e, OpenAIAPIError):
         error_msg = str(e)
         if "429" in error_msg:
             raise CoachingAPIError(
@@ -78,5 +86,47 @@ def get_coaching_tips(reference_text: str, scores: dict) -> str:
             "service_error",
             error_msg
         )
+    return f"Error connecting to Coach: {str(e)}"
+
+
+def get_coaching_tips(reference_text: str, scores: dict) -> str:
+    """
+    Uses LLM to generate feedback based on scores.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    
+    if not api_key:
+        return DEMO_MODE_TIPS
+
+    client = OpenAI(api_key=api_key)
+
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": _build_prompt(reference_text, scores)}]
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        return _handle_coaching_error(e)
+
+
+async def get_coaching_tips_async(reference_text: str, scores: dict) -> str:
+    """
+    Async variant of get_coaching_tips() using a shared AsyncOpenAI client.
+    Error classification is identical to the sync version.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        return DEMO_MODE_TIPS
+
+    client = _get_async_client(api_key)
+
+    try:
+        response = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": _build_prompt(reference_text, scores)}]
+        )
+        return response.choices[0].message.content
     except Exception as e:
-        return f"Error connecting to Coach: {str(e)}"
+        return _handle_coaching_error(e)
@@ -1,5 +1,7 @@
 import os
 import json
+import asyncio
+from typing import Optional
 
 try:
     import azure.cognitiveservices.speech as speechsdk
@@ -71,20 +73,15 @@ def parse_azure_response(result_json: str) -> dict:
         return {"error": f"Failed to parse Azure response: {str(e)}"}
 
 
-def get_pronunciation_score(audio_filepath: str, reference_text: str, strictness: int = 3) -> dict:
+# How long to wait for an async recognition before giving up
+RECOGNITION_TIMEOUT_SECONDS = float(os.getenv("AZURE_RECOGNITION_TIMEOUT_SECONDS", "60"))
+
+
+def _mock_score(reference_text: str) -> Optional[dict]:
     """
-    Sends audio to Azure for phoneme-level grading.
-    Returns a dictionary of scores.
-    
-    Args:
-        audio_filepath: Path to the audio file
-        reference_text: The text that should have been spoken
-        strictness: Grading strictness level (1-5, where 5 is strictest). Default is 3 for stricter grading.
+    Returns dummy scores for UI testing when Azure keys or the SDK are missing.
+    Returns None when the real Azure implementation should be used.
     """
-    
-    # Validate strictness parameter
-    strictness = max(1, min(5, strictness))  # Clamp between 1 and 5
-    
     # Check for API Keys
     azure_key = os.getenv("AZURE_SPEECH_KEY")
     azure_region = os.getenv("AZURE_SPEECH_REGION")
@@ -155,119 +152,238 @@ def get_pronunciation_score(audio_filepath: str, reference_text: str, strictness
             "azure_debug": mock_debug_data
         }
 
-    # Real Azure Implementation
-    try:
-        speech_config = speechsdk.SpeechConfig(subscription=azure_key, region=azure_region)
-        audio_config = speechsdk.audio.AudioConfig(filename=audio_filepath)
-
-        # Configure the assessment with strictness parameter
-        # Strictness 1 = most lenient (score threshold 30), 5 = most strict (score threshold 70)
-        # Default is 3 (score threshold 50) for balanced but stricter grading
-        score_thresholds = {
-            1: 30,  # Very lenient
-            2: 40,  # Lenient
-            3: 50,  # Balanced (stricter than before)
-            4: 60,  # Strict
-            5: 70   # Very strict
-        }
-        
-        pronunciation_config = speechsdk.PronunciationAssessmentConfig(
-            reference_text=reference_text,
-            grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
-            granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
-            enable_miscue=True
-        )
-        
-        # Set the accuracy threshold based on strictness
-        pronunciation_config.phoneme_alphabet = "IPA"
-        pronunciation_config.enable_prosody_assessment()
+    return None
 
-        recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
-        pronunciation_config.apply_to(recognizer)
 
-        # Run recognition
-        result = recognizer.recognize_once()
+def _create_recognizer(audio_filepath: str, reference_text: str):
+    """Builds a SpeechRecognizer with pronunciation assessment applied."""
+    azure_key = os.getenv("AZURE_SPEECH_KEY")
+    azure_region = os.getenv("AZURE_SPEECH_REGION")
 
-        # Check result
-        if result.reason == speechsdk.ResultReason.RecognizedSpeech:
-            pronunciation_result = speechsdk.PronunciationAssessmentResult(result)
-            
-            # Parse the detailed Azure response for debugging
-            azure_debug = parse_azure_response(result.json)
-            
-            # Apply strictness adjustment to scores
-            # Higher strictness = lower scores for the same performance
-            strictness_multiplier = 1.0 - ((strictness - 3) * 0.1)  # 3 is neutral (1.0x), 5 is strict (0.8x), 1 is lenient (1.2x)
-            
-            adjusted_pronunciation = pronunciation_result.pronunciation_score * strictness_multiplier
-            adjusted_fluency = pronunciation_result.fluency_score * strictness_multiplier
-            adjusted_completeness = pronunciation_result.completeness_score * strictness_multiplier
-            
-            # Cap at 100
-            adjusted_pronunciation = min(100, max(0, adjusted_pronunciation))
-            adjusted_fluency = min(100, max(0, adjusted_fluency))
-            adjusted_completeness = min(100, max(0, adjusted_completeness))
-            
-            return {
-                "pronunciation": round(adjusted_pronunciation, 1),
-                "fluency": round(adjusted_fluency, 1),
-                "completeness": round(adjusted_completeness, 1),
-                "azure_debug": azure_debug,
-                "strictness_level": strictness
-            }
-        elif result.reason == speechsdk.ResultReason.NoMatch:
-            return {"pronunciation": 0, "error": "No speech recognized."}
-        elif result.reason == speechsdk.ResultReason.Canceled:
-            cancellation = speechsdk.CancellationDetails(result)
-            error_msg = str(cancellation.error_details) if cancellation.error_details else "Speech analysis canceled"
-            
-            # Check for rate limiting or quota errors
-            if "429" in error_msg or "rate limit" in error_msg.lower() or "too many requests" in error_msg.lower():
-                raise APIError(
-                    "Azure Speech API rate limit exceeded. Please wait a moment and try again.",
-                    "rate_limit",
-                    error_msg
-                )
-            elif "quota" in error_msg.lower() or "exceeded" in error_msg.lower() or "limit" in error_msg.lower():
-                raise APIError(
-                    "Azure Speech API quota exceeded. The monthly limit has been reached. Please contact the app administrator.",
-                    "quota_exceeded",
-                    error_msg
-                )
-            elif "401" in error_msg or "403" in error_msg or "unauthorized" in error_msg.lower() or "invalid" in error_msg.lower():
-                raise APIError(
-                    "Azure Speech API authentication failed. Please contact the app administrator.",
-                    "auth_error",
-                    error_msg
-                )
-            else:
-                return {"pronunciation": 0, "error": f"Speech analysis canceled: {error_msg}"}
-        else:
-            return {"pronunciation": 0, "error": "Speech analysis failed."}
-             
-    except APIError:
-        raise  # Re-raise APIError to be handled by the caller
-    except Exception as e:
-        error_msg = str(e)
-        
-        # Check for common Azure error patterns
-        if "429" in error_msg or "rate limit" in error_msg.lower():
+    speech_config = speechsdk.SpeechConfig(subscription=azure_key, region=azure_region)
+    audio_config = speechsdk.audio.AudioConfig(filename=audio_filepath)
+
+    # Configure the assessment with strictness parameter
+    # Strictness 1 = most lenient (score threshold 30), 5 = most strict (score threshold 70)
+    # Default is 3 (score threshold 50) for balanced but stricter grading
+    score_thresholds = {
+        1: 30,  # Very lenient
+        2: 40,  # Lenient
+        3: 50,  # Balanced (stricter than before)
+        4: 60,  # Strict
+        5: 70   # Very strict
+    }
+
+    pronunciation_config = speechsdk.PronunciationAssessmentConfig(
+        reference_text=reference_text,
+        grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
+        granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
+        enable_miscue=True
+    )
+
+    # Set the accuracy threshold based on strictness
+    pronunciation_config.phoneme_alphabet = "IPA"
+    pronunciation_config.enable_prosody_assessment()
+
+    recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+    pronunciation_config.apply_to(recognizer)
+
+    return recognizer
+
+
+def _score_result(result, strictness: int) -> dict:
+    """
+    Converts a recognition result into scores, applying the strictness adjustment.
+    Raises APIError for rate limit, quota and auth cancellations.
+    """
+    # Check result
+    if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+        pronunciation_result = speechsdk.PronunciationAssessmentResult(result)
+
+        # Parse the detailed Azure response for debugging
+        azure_debug = parse_azure_response(result.json)
+
+        # Apply strictness adjustment to scores
+        # Higher strictness = lower scores for the same performance
+        strictness_multiplier = 1.0 - ((strictness - 3) * 0.1)  # 3 is neutral (1.0x), 5 is strict (0.8x), 1 is lenient (1.2x)
+
+        adjusted_pronunciation = pronunciation_result.pronunciation_score * strictness_multiplier
+        adjusted_fluency = pronunciation_result.fluency_score * strictness_multiplier
+        adjusted_completeness = pronunciation_result.completeness_score * strictness_multiplier
+
+        # Cap at 100
+        adjusted_pronunciation = min(100, max(0, adjusted_pronunciation))
+        adjusted_fluency = min(100, max(0, adjusted_fluency))
+        adjusted_completeness = min(100, max(0, adjusted_completeness))
+
+        return {
+            "pronunciation": round(adjusted_pronunciation, 1),
+            "fluency": round(adjusted_fluency, 1),
+            "completeness": round(adjusted_completeness, 1),
+            "azure_debug": azure_debug,
+            "strictness_level": strictness
+        }
+    elif result.reason == speechsdk.ResultReason.NoMatch:
+        return {"pronunciation": 0, "error": "No speech recognized."}
+    elif result.reason == speechsdk.ResultReason.Canceled:
+        cancellation = speechsdk.CancellationDetails(result)
+        error_msg = str(cancellation.error_details) if cancellation.error_details else "Speech analysis canceled"
+
+        # Check for rate limiting or quota errors
+        if "429" in error_msg or "rate limit" in error_msg.lower() or "too many requests" in error_msg.lower():
             raise APIError(
                 "Azure Speech API rate limit exceeded. Please wait a moment and try again.",
                 "rate_limit",
                 error_msg
             )
-        elif "quota" in error_msg.lower() or "exceeded" in error_msg.lower():
+        elif "quota" in error_msg.lower() or "exceeded" in error_msg.lower() or "limit" in error_msg.lower():
             raise APIError(
                 "Azure Speech API quota exceeded. The monthly limit has been reached. Please contact the app administrator.",
                 "quota_exceeded",
                 error_msg
             )
-        elif "401" in error_msg or "403" in error_msg or "unauthorized" in error_msg.lower():
+        elif "401" in error_msg or "403" in error_msg or "unauthorized" in error_msg.lower() or "invalid" in error_msg.lower():
             raise APIError(
                 "Azure Speech API authentication failed. Please contact the app administrator.",
                 "auth_error",
                 error_msg
             )
-        
-        return {"pronunciation": 0, "error": str(e)}
+        else:
+            return {"pronunciation": 0, "error": f"Speech analysis canceled: {error_msg}"}
+    else:
+        return {"pronunciation": 0, "error": "Speech analysis failed."}
+
+
+def _classify_exception(e: Exception) -> dict:
+    """
+    Raises APIError for rate limit, quota and auth failures.
+    Returns an error result for anything else.
+    """
+    error_msg = str(e)
+
+    # Check for common Azure error patterns
+    if "429" in error_msg or "rate limit" in error_msg.lower():
+        raise APIError(
+            "Azure Speech API rate limit exceeded. Please wait a moment and try again.",
+            "rate_limit",
+            error_msg
+        )
+    elif "quota" in error_msg.lower() or "exceeded" in error_msg.lower():
+        raise APIError(
+            "Azure Speech API quota exceeded. The monthly limit has been reached. Please contact the app administrator.",
+            "quota_exceeded",
+            error_msg
+        )
+    elif "401" in error_msg or "403" in error_msg or "unauthorized" in error_msg.lower():
+        raise APIError(
+            "Azure Speech API authentication failed. Please contact the app administrator.",
+            "auth_error",
+            error_msg
+        )
+
+    return {"pronunciation": 0, "error": str(e)}
+
+
+async def _recognize_once_async(recognizer):
+    """
+    Bridges recognize_once_async() into asyncio without blocking a thread.
+
+    The SDK's ResultFuture only offers a blocking get(), so completion is
+    signalled by the recognizer's recognized/canceled callbacks instead, which
+    fire on SDK threads and are handed to the event loop with
+    call_soon_threadsafe. get() is still called (on a worker thread, where it
+    returns at once) because it is what releases the SDK's native async handle.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve():
+        if not future.done():
+            future.set_result(None)
+
+    def on_event(evt):
+        loop.call_soon_threadsafe(resolve)
+
+    recognizer.recognized.connect(on_event)
+    recognizer.canceled.connect(on_event)
+    sdk_future = recognizer.recognize_once_async()
+    try:
+        await asyncio.wait_for(future, timeout=RECOGNITION_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # recognize_once can't be stopped early; release it whenever Azure finishes
+        _release_when_done(loop, recognizer, sdk_future)
+        raise TimeoutError("Speech analysis timed out")
+    except asyncio.CancelledError:
+        _release_when_done(loop, recognizer, sdk_future)
+        raise
+    finally:
+        recognizer.recognized.disconnect_all()
+        recognizer.canceled.disconnect_all()
+
+    return await asyncio.to_thread(sdk_future.get)
+
+
+def _release_when_done(loop, recognizer, sdk_future):
+    """Wait out an abandoned recognition on a worker thread so its handle is still released."""
+    def wait(recognizer):  # Holds the recognizer until the SDK is done with it
+        try:
+            sdk_future.get()
+        except Exception:
+            pass
+
+    loop.run_in_executor(None, wait, recognizer)
+
+
+def get_pronunciation_score(audio_filepath: str, reference_text: str, strictness: int = 3) -> dict:
+    """
+    Sends audio to Azure for phoneme-level grading.
+    Returns a dictionary of scores.
+    
+    Args:
+        audio_filepath: Path to the audio file
+        reference_text: The text that should have been spoken
+        strictness: Grading strictness level (1-5, where 5 is strictest). Default is 3 for stricter grading.
+    """
+    
+    # Validate strictness parameter
+    strictness = max(1, min(5, strictness))  # Clamp between 1 and 5
+
+    mock_result = _mock_score(reference_text)
+    if mock_result:
+        return mock_result
+
+    # Real Azure Implementation
+    try:
+        recognizer = _create_recognizer(audio_filepath, reference_text)
+
+        # Run recognition
+        result = recognizer.recognize_once()
+
+        return _score_result(result, strictness)
+    except APIError:
+        raise  # Re-raise APIError to be handled by the caller
+    except Exception as e:
+        return _classify_exception(e)
+
+
+async def get_pronunciation_score_async(audio_filepath: str, reference_text: str, strictness: int = 3) -> dict:
+    """
+    Async variant of get_pronunciation_score().
+    Awaits Azure without holding a thread, so many requests can wait on one event loop.
+    Only recognizer setup (which opens the audio file) runs on a worker thread.
+    Scores and error classification are identical to the sync version.
+    """
+    strictness = max(1, min(5, strictness))  # Clamp between 1 and 5
+
+    mock_result = _mock_score(reference_text)
+    if mock_result:
+        return mock_result
+
+    try:
+        recognizer = await asyncio.to_thread(_create_recognizer, audio_filepath, reference_text)
+        result = await _recognize_once_async(recognizer)
+        return _score_result(result, strictness)
+    except APIError:
+        raise  # Re-raise APIError to be handled by the caller
+    except Exception as e:
+        return _classify_exception(e)
@@ -13,8 +13,21 @@ os.environ.setdefault("AZURE_SPEECH_REGION", "")
 os.environ.setdefault("OPENAI_API_KEY", "")
 
 from main import app
+from request_logging import flush_logs
 
 # Create the Mangum handler
 # lifespan="off" is recommended for Lambda to avoid startup/shutdown issues
-handler = Mangum(app, lifespan="off")
+mangum_handler = Mangum(app, lifespan="off")
+
+
+def handler(event, context):
+    """
+    Lambda entry point.
+    Logs are written by a background thread, so drain the queue before the
+    runtime freezes the container between invocations.
+    """
+    try:
+        return mangum_handler(event, context)
+    finally:
+        flush_logs()
 
@@ -1,16 +1,30 @@
 import os
 import io
+import re
+import uuid
 import wave
+import logging
 import tempfile
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
 
 from auth import get_current_user, require_auth
 from dotenv import load_dotenv
 from pydub import AudioSegment
 
-from grading_engine import get_pronunciation_score, APIError
-from coaching_engine import get_coaching_tips, CoachingAPIError
+from grading_engine import get_pronunciation_score_async, APIError
+from coaching_engine import get_coaching_tips_async, CoachingAPIError
+from passage_engine import stream_convert_to_wav, get_passage_score_async, MAX_PASSAGE_MS
+from audio_store import (
+    save_attempt, get_attempt, open_audio_range, word_byte_range, wav_header,
+    max_response_bytes, presigned_audio_url,
+)
+from request_logging import configure_logging, bind_request, stage
+
+logger = logging.getLogger(__name__)
 
 
 def convert_to_wav(input_path: str, output_path: str) -> bool:
@@ -37,23 +51,138 @@ def convert_to_wav(input_path: str, output_path: str) -> bool:
         
         # Verify the file was created and has content
         if os.path.exists(output_path) and os.path.getsize(output_path) > 44:  # 44 = WAV header size
-            print(f"Audio converted successfully: {os.path.getsize(output_path)} bytes")
+            logger.debug("Audio converted", extra={"wav_bytes": os.path.getsize(output_path)})
             return True
         else:
-            print("Audio conversion produced empty or invalid file")
+            logger.warning("Audio conversion produced empty or invalid file")
             return False
             
     except Exception as e:
-        print(f"Audio conversion error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Audio conversion error")
         return False
 
+def parse_range_header(range_header: str, size: int):
+    """
+    Parse a single-range HTTP Range header ("bytes=start-end", "bytes=start-"
+    or "bytes=-suffix") into an inclusive (start, end) byte range.
+
+    Returns None if the header should be ignored (missing, malformed, invalid
+    such as "bytes=5-3", or multi-range), and raises HTTPException(416) if the
+    range is valid but unsatisfiable.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+
+    start_text, _, end_text = range_header[6:].strip().partition("-")
+    if not (start_text or end_text) or not all(text.isdigit() for text in (start_text, end_text) if text):
+        return None
+
+    if start_text:
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+        if end_text and end < start:
+            return None
+    else:
+        start = size - int(end_text)
+        end = size - 1
+
+    start = max(0, start)
+    end = min(end, size - 1)
+    if start >= size or end < 0:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def get_owned_attempt(request: Request, attempt_id: str) -> dict:
+    """
+    Fetch a stored attempt, hiding attempts that belong to another user.
+    The owner check relies on the JWT being verified upstream (API Gateway's
+    Cognito authorizer in production).
+    """
+    attempt = await run_in_threadpool(get_attempt, attempt_id)
+    if attempt is None:
+        raise HTTPException(status_code=404, detail="Attempt audio not found")
+
+    user = get_current_user(request)
+    if attempt["owner"] and (user is None or user.sub != attempt["owner"]):
+        raise HTTPException(status_code=404, detail="Attempt audio not found")
+    return attempt
+
+
 # Load environment variables
 load_dotenv()
 
+# Structured JSON logs, written off the request path
+configure_logging()
+
 app = FastAPI(title="AI Accent Coach API")
 
+
+# Client-supplied request IDs are logged and echoed back, so only short, plain IDs are accepted
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+class RequestLoggingMiddleware:
+    """
+    Tag every log record with a request ID and the user's sub, and log the outcome.
+
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware runs the
+    app in a separate task and re-streams the response, which cost about 40% of
+    /api/analyze throughput under load.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        event = scope.get("aws.event", {})
+        client_request_id = request.headers.get("X-Request-ID", "")
+        request_id = (
+            (client_request_id if REQUEST_ID_PATTERN.fullmatch(client_request_id) else None)
+            or event.get("requestContext", {}).get("requestId")
+            or uuid.uuid4().hex
+        )
+        user = get_current_user(request)
+        bind_request(request_id, user.sub if user else None)
+
+        status = 500  # Unless the app starts a response, the request failed
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
+
+        # Shared with the handler's request.state, even if routing copies the scope
+        scope.setdefault("state", {})
+        timings = {}
+        try:
+            with stage(timings, "total"):
+                await self.app(scope, receive, send_with_request_id)
+        finally:
+            # Handlers add fields (e.g. stage timings) via request.state.log_fields,
+            # so each request produces a single record
+            logger.info("Request completed", extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": status,
+                "duration_ms": timings["total"],
+                **scope["state"].get("log_fields", {}),
+            })
+
+
+app.add_middleware(RequestLoggingMiddleware)
+
 # Configure CORS for frontend
 # In production, CORS is handled by CloudFront/API Gateway
 # These origins are for local development
@@ -74,6 +203,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Range", "Accept-Ranges", "Content-Length", "X-Request-ID"],
 )
 
 # Sample sentences for practice
@@ -122,12 +252,16 @@ async def get_sentences():
     return {"sentences": PRACTICE_SENTENCES}
 
 
+ANALYZE_MODES = ("sentence", "passage")
+
+
 @app.post("/api/analyze")
 async def analyze_pronunciation(
     request: Request,
     audio: UploadFile = File(...),
     reference_text: str = Form(...),
-    strictness: int = Form(3)
+    strictness: int = Form(3),
+    mode: str = Form("sentence")
 ):
     """
     Analyze pronunciation from audio file.
@@ -138,35 +272,64 @@ async def analyze_pronunciation(
         audio: Audio file from recording
         reference_text: The text that should have been spoken
         strictness: Grading strictness level (1-5, default 3 for balanced/stricter)
+        mode: "sentence" for a single utterance, or "passage" for long-form reading
+              (stream-decoded, split on silence and graded per sentence group)
     """
-    # Get current user (for logging/tracking)
+    if mode not in ANALYZE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}'. Use one of: {', '.join(ANALYZE_MODES)}.")
+
+    # Get current user (for attempt ownership; the request ID and sub are already bound for logging)
     user = get_current_user(request)
-    if user:
-        print(f"Analyze request from user: {user.email or user.sub}")
     temp_input = None
     temp_wav = None
+    timings = {}
     
     try:
         # Save uploaded audio to temp file (browser sends webm/ogg, not wav)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
-            content = await audio.read()
-            temp_file.write(content)
-            temp_input = temp_file.name
+        with stage(timings, "upload"):
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
+                content = await audio.read()
+                temp_file.write(content)
+                temp_input = temp_file.name
 
         # Convert to proper WAV format for Azure Speech SDK
         temp_wav = temp_input.replace(".webm", "_converted.wav")
-        if not convert_to_wav(temp_input, temp_wav):
-            raise HTTPException(status_code=400, detail="Failed to process audio. Please try recording again.")
+        if mode == "passage":
+            with stage(timings, "convert"):
+                conversion = await run_in_threadpool(stream_convert_to_wav, temp_input, temp_wav)
+            if conversion is None:
+                raise HTTPException(status_code=400, detail="Failed to process audio. Please try recording again.")
+            if conversion["duration_ms"] > MAX_PASSAGE_MS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Passage recordings are limited to {MAX_PASSAGE_MS // 1000} seconds. Please record a shorter passage."
+                )
 
-        # Get pronunciation scores from Azure with strictness parameter
-        scores = get_pronunciation_score(temp_wav, reference_text, strictness)
+            # Long recordings are graded in sentence-aligned segments
+            with stage(timings, "grade"):
+                scores = await get_passage_score_async(temp_wav, conversion, reference_text, strictness)
+        else:
+            # Decoding is CPU/ffmpeg bound, so keep it off the event loop
+            with stage(timings, "convert"):
+                converted = await run_in_threadpool(convert_to_wav, temp_input, temp_wav)
+            if not converted:
+                raise HTTPException(status_code=400, detail="Failed to process audio. Please try recording again.")
+
+            # Get pronunciation scores from Azure with strictness parameter
+            with stage(timings, "grade"):
+                scores = await get_pronunciation_score_async(temp_wav, reference_text, strictness)
         
         # Check for errors
         if "error" in scores and scores.get("pronunciation", 0) == 0:
             raise HTTPException(status_code=400, detail=scores["error"])
         
         # Get coaching tips from OpenAI
-        coaching = get_coaching_tips(reference_text, scores)
+        with stage(timings, "coach"):
+            coaching = await get_coaching_tips_async(reference_text, scores)
+
+        # Keep the converted audio for replay; the store takes ownership of the file
+        with stage(timings, "store"):
+            attempt_id = await run_in_threadpool(save_attempt, temp_wav, scores, user.sub if user else None)
         
         return {
             "scores": {
@@ -178,13 +341,16 @@ async def analyze_pronunciation(
             "mock_mode": scores.get("mock_data", False),
             "mock_details": scores.get("details", None),
             "azure_debug": scores.get("azure_debug", None),
-            "strictness_level": scores.get("strictness_level", strictness)
+            "strictness_level": scores.get("strictness_level", strictness),
+            "segments": scores.get("segments", None),
+            "attempt_id": attempt_id
         }
         
     except HTTPException:
         raise
     except APIError as e:
         # Azure Speech API errors (rate limit, quota, auth)
+        logger.warning("Upstream error", extra={"service": "azure_speech", "error_type": e.error_type, "details": e.details})
         raise HTTPException(
             status_code=429 if e.error_type == "rate_limit" else 503,
             detail={
@@ -195,6 +361,7 @@ async def analyze_pronunciation(
         )
     except CoachingAPIError as e:
         # OpenAI API errors (rate limit, quota, auth)
+        logger.warning("Upstream error", extra={"service": "openai", "error_type": e.error_type, "details": e.details})
         raise HTTPException(
             status_code=429 if e.error_type == "rate_limit" else 503,
             detail={
@@ -204,8 +371,11 @@ async def analyze_pronunciation(
             }
         )
     except Exception as e:
+        logger.exception("Analyze failed")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
+        request.state.log_fields = {"mode": mode, "stages_ms": timings}
+
         # Clean up temp files
         if temp_input and os.path.exists(temp_input):
             os.unlink(temp_input)
@@ -213,6 +383,76 @@ async def analyze_pronunciation(
             os.unlink(temp_wav)
 
 
+@app.get("/api/attempts/{attempt_id}/audio")
+async def get_attempt_audio(request: Request, attempt_id: str):
+    """
+    Stream the stored 16kHz WAV for an attempt.
+    Supports single-range HTTP Range requests. Locally ranges are served from a
+    memory map; on S3 each response is capped to fit Lambda's payload limit and
+    full downloads that would not fit are redirected to a presigned S3 URL.
+    """
+    attempt = await get_owned_attempt(request, attempt_id)
+    size = attempt["size"]
+    byte_range = parse_range_header(request.headers.get("Range"), size)
+    limit = max_response_bytes()
+    headers = {"Accept-Ranges": "bytes"}
+
+    if byte_range is None:
+        if limit and size > limit:
+            url = await run_in_threadpool(presigned_audio_url, attempt)
+            return RedirectResponse(url, status_code=307)
+        start, end = 0, size - 1
+        status_code = 200
+    else:
+        start, end = byte_range
+        if limit:
+            # Clients re-request the rest, as with any short 206
+            end = min(end, start + limit - 1)
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    try:
+        body = await run_in_threadpool(open_audio_range, attempt, start, end + 1)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Attempt audio not found")
+
+    return StreamingResponse(body, status_code=status_code, media_type="audio/wav", headers=headers)
+
+
+@app.get("/api/attempts/{attempt_id}/words/{word_index}")
+async def get_attempt_word_audio(request: Request, attempt_id: str, word_index: int):
+    """
+    Return a WAV containing only one word of an attempt.
+    Only that word's PCM window is read (a zero-copy memory map slice locally).
+    """
+    attempt = await get_owned_attempt(request, attempt_id)
+    if word_index < 0 or word_index >= len(attempt["words"]):
+        raise HTTPException(status_code=404, detail="Word not found")
+
+    byte_range = word_byte_range(attempt, word_index)
+    if byte_range is None:
+        raise HTTPException(status_code=404, detail="No audio timing for this word")
+
+    start, end = byte_range
+    try:
+        chunks = await run_in_threadpool(open_audio_range, attempt, start, end)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Attempt audio not found")
+
+    header = wav_header(end - start)
+
+    def body():
+        yield header
+        yield from chunks
+
+    return StreamingResponse(
+        body(),
+        media_type="audio/wav",
+        headers={"Content-Length": str(len(header) + end - start)}
+    )
+
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
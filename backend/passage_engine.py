@@ -0,0 +1,462 @@
+"""
+Long-form passage assessment.
+
+Azure's recognize_once() stops after the first utterance (roughly 15-30 seconds),
+so paragraph-length recordings are split on silence into sentence-aligned
+segments, each segment is graded on its own, and the results are merged back
+into a single response with the same shape as get_pronunciation_score().
+"""
+
+import os
+import re
+import math
+import heapq
+import asyncio
+import wave
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from typing import Optional
+
+from pydub import AudioSegment
+
+try:
+    import audioop
+except ImportError:
+    from pydub import pyaudioop as audioop
+
+from grading_engine import get_pronunciation_score_async
+
+
+logger = logging.getLogger(__name__)
+
+# Azure-compatible PCM format: 16kHz, 16-bit, mono
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+BYTES_PER_MS = SAMPLE_RATE * SAMPLE_WIDTH // 1000
+
+# Silence detection runs on 10ms analysis frames while the audio is decoded
+FRAME_MS = 10
+FRAME_BYTES = FRAME_MS * BYTES_PER_MS
+READ_CHUNK_BYTES = FRAME_BYTES * 100  # 1 second of audio per pipe read
+
+SILENCE_THRESH_DBFS = float(os.getenv("PASSAGE_SILENCE_THRESH_DBFS", "-40"))
+MIN_SILENCE_MS = int(os.getenv("PASSAGE_MIN_SILENCE_MS", "300"))
+
+# recognize_once() can end an utterance after ~15 seconds or at any long pause,
+# so each segment holds a single sentence, and sentences estimated to run past
+# SEGMENT_MAX_MS are split between words
+SEGMENT_MAX_MS = int(os.getenv("PASSAGE_SEGMENT_MAX_MS", "9000"))
+
+# No segment may run past this, whatever the reading pace
+MAX_SEGMENT_MS = int(os.getenv("PASSAGE_MAX_SEGMENT_MS", "12000"))
+
+# Cuts are chosen among detected silences, or failing that among points on
+# this grid at a cost of NO_SILENCE_PENALTY (a squared log pace ratio, so 0.5
+# is roughly what a sentence read twice as fast as average costs)
+CUT_GRID_MS = 250
+NO_SILENCE_PENALTY = 0.5
+
+# Partial plans kept after each sentence; bounds planning time on long passages
+PLAN_BEAM_WIDTH = 200
+
+# Deployed, /api/analyze must finish within API Gateway's 30 second integration
+# timeout (the Lambda itself allows 60), which bounds how much audio can be
+# graded per request. Longer passages are rejected rather than timing out.
+MAX_PASSAGE_MS = int(os.getenv("PASSAGE_MAX_DURATION_MS", "90000"))
+
+CONVERT_TIMEOUT_SECONDS = float(os.getenv("PASSAGE_CONVERT_TIMEOUT_SECONDS", "120"))
+MAX_WORKERS = int(os.getenv("PASSAGE_MAX_WORKERS", "4"))
+
+# Azure reports word timings in 100-nanosecond units
+TICKS_PER_MS = 10000
+
+
+def stream_convert_to_wav(input_path: str, output_path: str) -> Optional[dict]:
+    """
+    Stream-decode any audio format into an Azure-compatible WAV file.
+
+    Unlike convert_to_wav(), the recording is never held in memory: ffmpeg
+    writes raw PCM to a pipe, which is copied to the WAV file one second at a
+    time while silent stretches are detected on the fly.
+
+    Returns a dict with the total duration and a list of (start_ms, end_ms)
+    silences, or None if the conversion failed.
+    """
+    command = [
+        AudioSegment.converter, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", input_path,
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "pipe:1",
+    ]
+    threshold_rms = 32768 * math.pow(10, SILENCE_THRESH_DBFS / 20)
+
+    # stderr goes to a file rather than a pipe: a corrupt recording can produce
+    # more decode errors than a pipe buffer holds, which would stall ffmpeg
+    # while we wait on stdout
+    stderr_file = tempfile.TemporaryFile()
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file)
+    except OSError:
+        stderr_file.close()
+        logger.exception("Audio conversion error")
+        return None
+
+    # Killing ffmpeg closes stdout, which ends the read loop below
+    timed_out = threading.Event()
+
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+
+    watchdog = threading.Timer(CONVERT_TIMEOUT_SECONDS, kill_on_timeout)
+    watchdog.start()
+
+    silences = []
+    silence_start = None
+    position_ms = 0
+    pending = b""
+
+    try:
+        with wave.open(output_path, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(SAMPLE_WIDTH)
+            wav_file.setframerate(SAMPLE_RATE)
+
+            while True:
+                chunk = process.stdout.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                wav_file.writeframes(chunk)
+
+                data = pending + chunk
+                usable = len(data) - len(data) % FRAME_BYTES
+                for start in range(0, usable, FRAME_BYTES):
+                    is_silent = audioop.rms(data[start:start + FRAME_BYTES], SAMPLE_WIDTH) < threshold_rms
+                    if is_silent and silence_start is None:
+                        silence_start = position_ms
+                    elif not is_silent and silence_start is not None:
+                        if position_ms - silence_start >= MIN_SILENCE_MS:
+                            silences.append((silence_start, position_ms))
+                        silence_start = None
+                    position_ms += FRAME_MS
+                pending = data[usable:]
+
+        process.wait()
+    except Exception:
+        process.kill()
+        process.wait()
+        logger.exception("Audio conversion error")
+        return None
+    finally:
+        watchdog.cancel()
+        process.stdout.close()
+        stderr_file.seek(0)
+        stderr = stderr_file.read(4096)
+        stderr_file.close()
+
+    if process.returncode != 0:
+        logger.warning("Audio conversion error", extra={
+            "ffmpeg_error": stderr.decode(errors='replace').strip(),
+            "timed_out": timed_out.is_set(),
+        })
+        return None
+
+    duration_ms = position_ms + len(pending) // BYTES_PER_MS
+    if silence_start is not None and duration_ms - silence_start >= MIN_SILENCE_MS:
+        silences.append((silence_start, duration_ms))
+
+    if duration_ms == 0:
+        logger.warning("Audio conversion produced empty or invalid file")
+        return None
+
+    logger.debug("Audio stream-converted", extra={
+        "wav_bytes": os.path.getsize(output_path),
+        "duration_ms": duration_ms,
+        "silences": len(silences),
+    })
+    return {"duration_ms": duration_ms, "silences": silences}
+
+
+def split_sentences(reference_text: str) -> list:
+    """Split a passage into sentences on terminal punctuation."""
+    sentences = re.split(r'(?<=[.!?])\s+', reference_text.strip())
+    return [s for s in sentences if s]
+
+
+def split_long_sentence(sentence: str, ms_per_char: float) -> list:
+    """
+    Split a sentence between words into pieces estimated to fit SEGMENT_MAX_MS.
+    Sentences that already fit are returned unchanged as a single piece.
+    """
+    words = sentence.split()
+    estimated_ms = len(sentence.replace(" ", "")) * ms_per_char
+    parts = min(len(words), math.ceil(estimated_ms / SEGMENT_MAX_MS))
+    if parts <= 1:
+        return [sentence]
+
+    # Greedily fill each piece up to an equal share of the sentence's characters
+    total_chars = sum(len(word) for word in words)
+    pieces = []
+    current = []
+    chars = 0
+    for index, word in enumerate(words):
+        current.append(word)
+        chars += len(word)
+        remaining_words = len(words) - index - 1
+        remaining_pieces = parts - len(pieces) - 1
+        if remaining_pieces and remaining_words >= remaining_pieces and chars >= total_chars * (len(pieces) + 1) / parts:
+            pieces.append(" ".join(current))
+            current = []
+    pieces.append(" ".join(current))
+    return pieces
+
+
+def plan_segments(sentences: list, duration_ms: int, silences: list) -> list:
+    """
+    Split the recording into one segment per sentence and choose where to cut.
+
+    Each sentence's length is estimated from its share of the passage's
+    characters, and the cuts are chosen together by dynamic programming so that
+    every segment's length stays as close as possible (as a ratio) to its
+    estimate. Cuts fall on detected silences unless none fits, in which case a
+    point on a CUT_GRID_MS grid is used at a penalty. Because each segment is
+    scored on its own, a reader who speeds up or slows down part way through
+    does not shift every later cut. Sentences estimated to run past
+    SEGMENT_MAX_MS are split between words, and no segment's speech runs past
+    MAX_SEGMENT_MS.
+
+    Returns a list of {"text", "start_ms", "end_ms"} dicts covering the whole
+    recording.
+    """
+    # Ignore leading and trailing silence when estimating where speech falls
+    speech_start = 0
+    speech_end = duration_ms
+    if silences and silences[0][0] == 0:
+        speech_start = silences[0][1]
+    if silences and silences[-1][1] == duration_ms:
+        speech_end = max(speech_start, silences[-1][0])
+
+    def chars(text):
+        return len(text.replace(" ", "")) or 1
+
+    speech_ms = speech_end - speech_start
+    ms_per_char = speech_ms / sum(chars(s) for s in sentences)
+    texts = []
+    for sentence in sentences:
+        texts.extend(split_long_sentence(sentence, ms_per_char))
+
+    cuts = _choose_cuts(
+        [chars(text) * ms_per_char for text in texts],
+        speech_start, speech_end,
+        [(start + end) // 2 for start, end in silences if speech_start < (start + end) // 2 < speech_end]
+    )
+
+    starts = [0] + cuts
+    ends = cuts + [duration_ms]
+    return [
+        {"text": text, "start_ms": start, "end_ms": end}
+        for text, start, end in zip(texts, starts, ends)
+    ]
+
+
+def _choose_cuts(expected_ms: list, speech_start: int, speech_end: int, silence_cuts: list) -> list:
+    """
+    Pick len(expected_ms) - 1 increasing cut positions between speech_start and
+    speech_end, minimising the sum over segments of log(actual / expected)^2
+    plus NO_SILENCE_PENALTY for every cut that is not on a silence.
+    """
+    if len(expected_ms) == 1:
+        return []
+
+    grid = range(speech_start + CUT_GRID_MS, speech_end - CUT_GRID_MS + 1, CUT_GRID_MS)
+    nodes = sorted(
+        [(speech_start, 0.0)]
+        + [(position, 0.0) for position in set(silence_cuts)]
+        + [(position, NO_SILENCE_PENALTY) for position in grid if position not in silence_cuts]
+        + [(speech_end, 0.0)]
+    )
+    last = len(nodes) - 1
+
+    # best[i] = (cost, previous node) for the best way to end the current segment at node i
+    best = {0: (0.0, None)}
+    history = []
+    for index, expected in enumerate(expected_ms):
+        final = index == len(expected_ms) - 1
+        shortest = max(FRAME_MS, expected / 3)
+        following = {}
+        for i, (cost, _) in best.items():
+            position = nodes[i][0]
+            for j in range(i + 1, last + 1):
+                length = nodes[j][0] - position
+                if length > MAX_SEGMENT_MS:
+                    break
+                if length < shortest or (j == last) != final:
+                    continue
+                total = cost + math.log(length / expected) ** 2 + nodes[j][1]
+                if j not in following or total < following[j][0]:
+                    following[j] = (total, i)
+        history.append(following)
+        best = dict(heapq.nsmallest(PLAN_BEAM_WIDTH, following.items(), key=lambda item: item[1][0]))
+
+    if last not in best:
+        # Only possible with degenerate timings; fall back to proportional cuts
+        cuts = []
+        position = speech_start
+        for expected in expected_ms[:-1]:
+            position += expected
+            cuts.append(int(position))
+        return cuts
+
+    cuts = []
+    node = last
+    for following in reversed(history[1:]):
+        node = following[node][1]
+        cuts.append(nodes[node][0])
+    return cuts[::-1]
+
+
+def write_segment(wav_path: str, segment_path: str, start_ms: int, end_ms: int):
+    """Copy one time window of a 16kHz mono WAV file into its own WAV file."""
+    with wave.open(wav_path, 'rb') as source:
+        source.setpos(start_ms * SAMPLE_RATE // 1000)
+        frames = source.readframes((end_ms - start_ms) * SAMPLE_RATE // 1000)
+    with wave.open(segment_path, 'wb') as target:
+        target.setnchannels(1)
+        target.setsampwidth(SAMPLE_WIDTH)
+        target.setframerate(SAMPLE_RATE)
+        target.writeframes(frames)
+
+
+def merge_segment_scores(segments: list, results: list, strictness: int) -> dict:
+    """
+    Merge per-segment results into a single get_pronunciation_score() result.
+
+    Scores are averaged weighted by each segment's reference word count, and
+    word offsets are shifted by the segment's start time so they stay relative
+    to the start of the full recording.
+    """
+    weights = [len(segment["text"].split()) for segment in segments]
+    total_weight = sum(weights) or 1
+
+    def weighted(values):
+        return round(sum(v * w for v, w in zip(values, weights)) / total_weight, 1)
+
+    words = []
+    recognized = []
+    metrics = {"accuracy_score": [], "fluency_score": [], "completeness_score": [], "pronunciation_score": []}
+    segment_summaries = []
+
+    for segment, result in zip(segments, results):
+        debug = result.get("azure_debug") or {}
+        offset_ticks = segment["start_ms"] * TICKS_PER_MS
+
+        for word in debug.get("words", []):
+            word = dict(word)
+            if word.get("offset") is not None:
+                word["offset"] += offset_ticks
+            words.append(word)
+
+        if debug.get("recognized_text"):
+            recognized.append(debug["recognized_text"])
+
+        overall = debug.get("overall_metrics", {})
+        for key in metrics:
+            metrics[key].append(overall.get(key, 0))
+
+        segment_summaries.append({
+            "text": segment["text"],
+            "start_ms": segment["start_ms"],
+            "end_ms": segment["end_ms"],
+            "pronunciation": result.get("pronunciation", 0),
+            "fluency": result.get("fluency", 0),
+            "completeness": result.get("completeness", 0),
+            "error": result.get("error"),
+        })
+
+    merged = {
+        "pronunciation": weighted([r.get("pronunciation", 0) for r in results]),
+        "fluency": weighted([r.get("fluency", 0) for r in results]),
+        "completeness": weighted([r.get("completeness", 0) for r in results]),
+        "azure_debug": {
+            "recognized_text": " ".join(recognized),
+            "words": words,
+            "overall_metrics": {key: weighted(values) for key, values in metrics.items()},
+        },
+        "strictness_level": strictness,
+        "segments": segment_summaries,
+    }
+
+    mock_results = [r for r in results if r.get("mock_data")]
+    if mock_results:
+        merged["mock_data"] = True
+        merged["details"] = mock_results[0].get("details")
+
+    return merged
+
+
+def write_segments(wav_path: str, segments: list, segment_dir: str) -> list:
+    """Write every planned segment to its own WAV file in segment_dir and return the paths."""
+    paths = []
+    for index, segment in enumerate(segments):
+        path = os.path.join(segment_dir, f"segment_{index}.wav")
+        write_segment(wav_path, path, segment["start_ms"], segment["end_ms"])
+        paths.append(path)
+    return paths
+
+
+def combine_results(segments: list, results: list, strictness: int) -> dict:
+    """Merge segment results, or return the first error if no segment could be graded."""
+    errors = [r["error"] for r in results if "error" in r and r.get("pronunciation", 0) == 0]
+    if len(errors) == len(results):
+        return {"pronunciation": 0, "error": errors[0]}
+
+    return merge_segment_scores(segments, results, strictness)
+
+
+async def get_passage_score_async(wav_path: str, conversion: dict, reference_text: str, strictness: int = 3) -> dict:
+    """
+    Grade a long recording against a multi-sentence reference passage.
+    Segments are graded concurrently on the event loop, at most MAX_WORKERS at a
+    time. Planning, splitting the WAV and cleaning up run on worker threads.
+
+    Args:
+        wav_path: Path to the WAV file written by stream_convert_to_wav()
+        conversion: The duration/silence info returned by stream_convert_to_wav()
+        reference_text: The passage that should have been spoken
+        strictness: Grading strictness level (1-5), passed through to every segment
+
+    APIError from any segment is propagated unchanged, and the remaining
+    segments are cancelled so they stop using Azure quota.
+    """
+    sentences = split_sentences(reference_text)
+    if not sentences:
+        return {"pronunciation": 0, "error": "Reference passage is empty."}
+
+    # Planning is a CPU-bound search, so keep it off the event loop too
+    segments = await asyncio.to_thread(plan_segments, sentences, conversion["duration_ms"], conversion["silences"])
+    semaphore = asyncio.Semaphore(MAX_WORKERS)
+
+    async def grade(path, segment):
+        async with semaphore:
+            return await get_pronunciation_score_async(path, segment["text"], strictness)
+
+    segment_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix="passage_")
+    try:
+        paths = await asyncio.to_thread(write_segments, wav_path, segments, segment_dir)
+        tasks = [asyncio.ensure_future(grade(path, segment)) for path, segment in zip(paths, segments)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the other segments, and let them unwind before their files are deleted
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    finally:
+        await asyncio.to_thread(shutil.rmtree, segment_dir, ignore_errors=True)
+
+    return combine_results(segments, results, strictness)
@@ -0,0 +1,217 @@
+"""
+Structured, non-blocking request logging.
+
+Records are emitted as one JSON object per line, tagged with the current
+request ID and the user's Cognito `sub` (never their email). The request
+thread only filters and enqueues records; formatting (including tracebacks)
+and writing to stdout/CloudWatch happen on a background QueueListener thread.
+
+Sampling is configured per level with LOG_SAMPLE_RATES, e.g.
+"DEBUG=0,INFO=0.25". Decisions are made per request ID, so a sampled request
+keeps all of its records at that level. Levels not listed are always kept.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+user_sub_var = contextvars.ContextVar("user_sub", default=None)
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Attributes every LogRecord has; anything else was passed via `extra`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# How long flush_logs() waits for the listener before giving up
+FLUSH_TIMEOUT_SECONDS = float(os.getenv("LOG_FLUSH_TIMEOUT_SECONDS", "2"))
+
+logger = logging.getLogger(__name__)
+
+_listener = None
+_queue = None
+
+
+def parse_sample_rates(value: str) -> dict:
+    """
+    Parse "DEBUG=0.1,INFO=0.5" into {logging.DEBUG: 0.1, logging.INFO: 0.5}.
+    Malformed entries are skipped with a warning rather than failing startup.
+    """
+    rates = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        try:
+            rate = float(rate)
+        except ValueError:
+            rate = None
+        if not isinstance(level, int) or rate is None or rate != rate:  # rate != rate catches NaN
+            logger.warning("Ignoring invalid LOG_SAMPLE_RATES entry", extra={"entry": item.strip()})
+            continue
+        rates[level] = max(0.0, min(1.0, rate))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configurable fraction of records per level, decided per request."""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+
+        request_id = request_id_var.get()
+        if request_id:
+            # Same request, same decision, so sampled requests stay complete
+            return zlib.crc32(f"{request_id}:{record.levelno}".encode()) / 2**32 < rate
+        return random.random() < rate
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does the minimum on the calling thread.
+
+    The stock handler formats the message and traceback before enqueueing; this
+    one only resolves %-args and attaches the request context, leaving all
+    formatting to the listener thread. Records are dropped rather than blocking
+    when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id_var.get()
+        record.user_sub = user_sub_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object with UTC timestamps."""
+
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "user_sub": getattr(record, "user_sub", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(stream=None) -> logging.handlers.QueueListener:
+    """
+    Route the root logger through a bounded queue to a JSON stream handler
+    running on a background thread. Replaces any handlers already installed
+    (e.g. by the Lambda runtime) so records are not written twice.
+
+    Args:
+        stream: Where JSON lines are written (defaults to stdout)
+    """
+    global _listener, _queue
+    if _listener is not None:
+        _listener.stop()
+
+    # JsonFormatter never prints thread, process or caller details, so skip
+    # collecting them for every record
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False
+    logging._srcfile = None
+
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = ContextQueueHandler(_queue)
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    # Parsed once the pipeline is up so warnings about bad entries are written
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))))
+    return _listener
+
+
+def flush_logs(timeout: float = None):
+    """
+    Wait until every queued record has been written, for at most `timeout`
+    seconds (FLUSH_TIMEOUT_SECONDS by default). Returns immediately if the
+    listener is not running, since nothing would drain the queue.
+    """
+    if _listener is None or _queue is None:
+        return
+    timeout = FLUSH_TIMEOUT_SECONDS if timeout is None else timeout
+    with _queue.all_tasks_done:
+        _queue.all_tasks_done.wait_for(lambda: not _queue.unfinished_tasks, timeout)
+
+
+def shutdown_logging():
+    """Drain the queue and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def bind_request(request_id: str, user_sub: Optional[str] = None):
+    """Attach a request ID and user `sub` to every record logged in this context."""
+    request_id_var.set(request_id)
+    user_sub_var.set(user_sub)
+
+
+@contextmanager
+def stage(timings: dict, name: str):
+    """Record how long the wrapped block took, in milliseconds, under timings[name]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
@@ -0,0 +1,152 @@
+import os
+import wave
+
+import pytest
+from fastapi import HTTPException
+
+import audio_store
+from audio_store import (
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+    TICKS_PER_SECOND,
+    save_attempt,
+    get_attempt,
+    open_audio_range,
+    word_byte_range,
+    wav_header,
+)
+from main import parse_range_header
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh local store in a temporary directory."""
+    monkeypatch.setattr(audio_store, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(audio_store, "BUCKET", None)
+    monkeypatch.setattr(audio_store, "STORE_ENABLED", True)
+    monkeypatch.setattr(audio_store, "_store_bytes", None)
+    return tmp_path
+
+
+def make_wav(path, seconds=1.0):
+    frames = int(SAMPLE_RATE * seconds)
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes((bytes(range(256)) * (frames * SAMPLE_WIDTH // 256 + 1))[:frames * SAMPLE_WIDTH])
+    return str(path)
+
+
+def scores_with_words(*words):
+    return {"azure_debug": {"words": [
+        {"word": word, "offset": int(start * TICKS_PER_SECOND), "duration": int(length * TICKS_PER_SECOND)}
+        for word, start, length in words
+    ]}}
+
+
+# --- Range parsing ---
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None, "", "items=0-1", "bytes=0-1,5-6", "bytes=abc", "bytes=-", "bytes=--5", "bytes=5-3",
+])
+def test_parse_range_header_ignores_invalid(header):
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=-0"])
+def test_parse_range_header_unsatisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range_header(header, 1000)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */1000"
+
+
+# --- Local store ---
+
+def test_save_and_read_attempt(store):
+    wav_path = make_wav(store / "input.wav")
+    size = os.path.getsize(wav_path)
+
+    attempt_id = save_attempt(wav_path, scores_with_words(("hello", 0.1, 0.4)), owner="user-1")
+    attempt = get_attempt(attempt_id)
+
+    assert not os.path.exists(wav_path)
+    assert attempt["owner"] == "user-1"
+    assert attempt["size"] == size
+    assert attempt["data_offset"] == 44
+    assert attempt["data_size"] == size - 44
+
+    with open(audio_store._audio_path(attempt_id), "rb") as stored:
+        content = stored.read()
+    assert b"".join(open_audio_range(attempt, 0, size)) == content
+    assert b"".join(open_audio_range(attempt, 100, 200)) == content[100:200]
+
+
+def test_get_attempt_rejects_unknown_ids(store):
+    assert get_attempt("0" * 32) is None
+    assert get_attempt("../../etc/passwd") is None
+
+
+def test_word_byte_range(store):
+    attempt_id = save_attempt(make_wav(store / "input.wav"), scores_with_words(
+        ("hello", 0.25, 0.5),
+        ("world", 0.9, 0.5),
+        ("missing", 5.0, 0.5),
+    ))
+    attempt = get_attempt(attempt_id)
+    bytes_per_second = SAMPLE_RATE * SAMPLE_WIDTH
+
+    assert word_byte_range(attempt, 0) == (44 + bytes_per_second // 4, 44 + 3 * bytes_per_second // 4)
+    # Clamped to the end of the recording
+    assert word_byte_range(attempt, 1)[1] == 44 + bytes_per_second
+    # Entirely past the end
+    assert word_byte_range(attempt, 2) is None
+
+
+def test_eviction_uses_running_total(store, monkeypatch):
+    size = os.path.getsize(make_wav(store / "probe.wav"))
+    monkeypatch.setattr(audio_store, "MAX_STORE_BYTES", size * 2)
+
+    first = save_attempt(make_wav(store / "a.wav"), {})
+    os.utime(audio_store._audio_path(first), (0, 0))
+    second = save_attempt(make_wav(store / "b.wav"), {})
+    assert audio_store._store_bytes == size * 2
+
+    scans = []
+    scan_store = audio_store._scan_store
+    monkeypatch.setattr(audio_store, "_scan_store", lambda: scans.append(1) or scan_store())
+
+    third = save_attempt(make_wav(store / "c.wav"), {})
+
+    assert len(scans) == 1
+    assert get_attempt(first) is None
+    assert get_attempt(second) is not None
+    assert get_attempt(third) is not None
+    assert audio_store._store_bytes == size * 2
+
+
+def test_store_disabled_without_bucket_on_lambda(store, monkeypatch):
+    monkeypatch.setattr(audio_store, "STORE_ENABLED", False)
+    wav_path = make_wav(store / "input.wav")
+
+    assert save_attempt(wav_path, {}) is None
+    assert os.path.exists(wav_path)
+
+
+def test_wav_header_matches_wave_module(store):
+    wav_path = make_wav(store / "input.wav", seconds=0.5)
+    with open(wav_path, "rb") as wav_file:
+        expected = wav_file.read(44)
+    assert wav_header(os.path.getsize(wav_path) - 44) == expected
@@ -0,0 +1,71 @@
+import asyncio
+import types
+
+import httpx
+import openai
+import pytest
+
+import coaching_engine
+from coaching_engine import CoachingAPIError, get_coaching_tips, get_coaching_tips_async
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def status_error(error_class, status, message):
+    return error_class(message, response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def fake_client(error, is_async):
+    """OpenAI client stand-in whose chat.completions.create() raises `error`."""
+    if is_async:
+        async def create(**kwargs):
+            raise error
+    else:
+        def create(**kwargs):
+            raise error
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+
+@pytest.fixture
+def failing_openai(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+
+    def use(error):
+        monkeypatch.setattr(coaching_engine, "OpenAI", lambda api_key: fake_client(error, is_async=False))
+        monkeypatch.setattr(coaching_engine, "_get_async_client", lambda api_key: fake_client(error, is_async=True))
+
+    return use
+
+
+@pytest.mark.parametrize("error, error_type", [
+    (status_error(openai.RateLimitError, 429, "Rate limit reached for gpt-4o"), "rate_limit"),
+    (status_error(openai.RateLimitError, 429, "You exceeded your current quota"), "quota_exceeded"),
+    (status_error(openai.AuthenticationError, 401, "Incorrect API key provided"), "auth_error"),
+    (status_error(openai.InternalServerError, 500, "The server had an error"), "service_error"),
+    (openai.APIError("Error code: 429", REQUEST, body=None), "rate_limit"),
+], ids=["rate-limit", "quota", "auth", "service", "api-error-429"])
+def test_errors_match_between_sync_and_async(failing_openai, error, error_type):
+    failing_openai(error)
+
+    with pytest.raises(CoachingAPIError) as sync_error:
+        get_coaching_tips("Hello.", {"pronunciation": 80})
+    with pytest.raises(CoachingAPIError) as async_error:
+        asyncio.run(get_coaching_tips_async("Hello.", {"pronunciation": 80}))
+
+    assert sync_error.value.error_type == async_error.value.error_type == error_type
+    assert sync_error.value.message == async_error.value.message
+
+
+def test_other_errors_fall_back_to_message_in_both(failing_openai):
+    failing_openai(ValueError("unexpected response"))
+
+    sync_result = get_coaching_tips("Hello.", {"pronunciation": 80})
+    async_result = asyncio.run(get_coaching_tips_async("Hello.", {"pronunciation": 80}))
+
+    assert sync_result == async_result == "Error connecting to Coach: unexpected response"
+
+
+def test_demo_mode_without_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    assert get_coaching_tips("Hello.", {}) == asyncio.run(get_coaching_tips_async("Hello.", {})) == coaching_engine.DEMO_MODE_TIPS
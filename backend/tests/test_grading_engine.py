@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import types
+
+import pytest
+
+import grading_engine
+from grading_engine import APIError, get_pronunciation_score, get_pronunciation_score_async
+
+
+class Signal:
+    """Stand-in for the SDK's EventSignal."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        self.callbacks.append(callback)
+
+    def disconnect_all(self):
+        self.callbacks = []
+
+    def fire(self, result):
+        for callback in list(self.callbacks):
+            callback(types.SimpleNamespace(result=result))
+
+
+class ResultFuture:
+    """Stand-in for the SDK's ResultFuture; get() blocks until the recognition ends."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.get_calls = 0
+
+    def get(self):
+        self.done.wait()
+        self.get_calls += 1
+        return self.result
+
+
+class FakeRecognizer:
+    """
+    Recognizer that finishes on its own thread after `delay` seconds, firing
+    recognized or canceled like the SDK does, or raises from recognize_once.
+    """
+
+    def __init__(self, result=None, error=None, delay=0.01):
+        self.result = result
+        self.error = error
+        self.delay = delay
+        self.recognized = Signal()
+        self.canceled = Signal()
+        self.sdk_future = ResultFuture()
+        self.callback_threads = []
+
+    def recognize_once(self):
+        if self.error:
+            raise self.error
+        return self.result
+
+    def recognize_once_async(self):
+        if self.error:
+            raise self.error
+
+        def finish():
+            self.callback_threads.append(threading.current_thread())
+            signal = self.canceled if self.result.reason == "Canceled" else self.recognized
+            signal.fire(self.result)
+            self.sdk_future.result = self.result
+            self.sdk_future.done.set()
+
+        threading.Timer(self.delay, finish).start()
+        return self.sdk_future
+
+
+class CancellationDetails:
+    def __init__(self, result):
+        self.error_details = result.error_details
+
+
+@pytest.fixture
+def fake_sdk(monkeypatch):
+    """Route grading through a fake SDK so the real (non-mock) code paths run."""
+    monkeypatch.setenv("AZURE_SPEECH_KEY", "key")
+    monkeypatch.setenv("AZURE_SPEECH_REGION", "region")
+    monkeypatch.setattr(grading_engine, "speechsdk", types.SimpleNamespace(
+        ResultReason=types.SimpleNamespace(RecognizedSpeech="RecognizedSpeech", NoMatch="NoMatch", Canceled="Canceled"),
+        CancellationDetails=CancellationDetails,
+    ))
+
+    def use(recognizer):
+        monkeypatch.setattr(grading_engine, "_create_recognizer", lambda *args: recognizer)
+        return recognizer
+
+    return use
+
+
+def canceled(error_details):
+    return types.SimpleNamespace(reason="Canceled", error_details=error_details)
+
+
+# --- Callback bridge ---
+
+def test_bridge_returns_result_from_sdk_thread():
+    result = canceled("boom")
+    recognizer = FakeRecognizer(result)
+
+    assert asyncio.run(grading_engine._recognize_once_async(recognizer)) is result
+    assert recognizer.callback_threads[0] is not threading.main_thread()
+    assert recognizer.sdk_future.get_calls == 1
+    assert recognizer.recognized.callbacks == [] and recognizer.canceled.callbacks == []
+
+
+def test_bridge_handles_recognized_event():
+    result = types.SimpleNamespace(reason="NoMatch")
+
+    assert asyncio.run(grading_engine._recognize_once_async(FakeRecognizer(result))) is result
+
+
+def test_bridge_times_out_and_still_releases_the_sdk_future(monkeypatch):
+    monkeypatch.setattr(grading_engine, "RECOGNITION_TIMEOUT_SECONDS", 0.05)
+    recognizer = FakeRecognizer(canceled("late"), delay=0.3)
+
+    async def run():
+        with pytest.raises(TimeoutError):
+            await grading_engine._recognize_once_async(recognizer)
+        assert recognizer.sdk_future.get_calls == 0
+
+    # asyncio.run() waits for the executor, where the abandoned recognition is waited out
+    asyncio.run(run())
+    assert recognizer.sdk_future.get_calls == 1
+    assert recognizer.recognized.callbacks == [] and recognizer.canceled.callbacks == []
+
+
+# --- Sync and async parity ---
+
+ERROR_CASES = [
+    ("Canceled: 429 Too Many Requests", "rate_limit"),
+    ("Monthly quota exceeded", "quota_exceeded"),
+    ("401 Unauthorized: invalid subscription key", "auth_error"),
+]
+
+
+@pytest.mark.parametrize("error_details, error_type", ERROR_CASES)
+def test_cancellation_errors_match_between_sync_and_async(fake_sdk, error_details, error_type):
+    fake_sdk(FakeRecognizer(canceled(error_details)))
+    with pytest.raises(APIError) as sync_error:
+        get_pronunciation_score("audio.wav", "Hello.")
+
+    fake_sdk(FakeRecognizer(canceled(error_details)))
+    with pytest.raises(APIError) as async_error:
+        asyncio.run(get_pronunciation_score_async("audio.wav", "Hello."))
+
+    assert sync_error.value.error_type == async_error.value.error_type == error_type
+    assert sync_error.value.message == async_error.value.message
+
+
+@pytest.mark.parametrize("message, error_type", [
+    ("HTTP 429 from service", "rate_limit"),
+    ("Quota exceeded for resource", "quota_exceeded"),
+    ("403 Forbidden", "auth_error"),
+])
+def test_exceptions_match_between_sync_and_async(fake_sdk, message, error_type):
+    fake_sdk(FakeRecognizer(error=RuntimeError(message)))
+    with pytest.raises(APIError) as sync_error:
+        get_pronunciation_score("audio.wav", "Hello.")
+    with pytest.raises(APIError) as async_error:
+        asyncio.run(get_pronunciation_score_async("audio.wav", "Hello."))
+
+    assert sync_error.value.error_type == async_error.value.error_type == error_type
+
+
+@pytest.mark.parametrize("recognizer", [
+    FakeRecognizer(canceled("Connection reset")),
+    FakeRecognizer(types.SimpleNamespace(reason="NoMatch")),
+    FakeRecognizer(error=RuntimeError("Audio file is corrupt")),
+], ids=["other-cancellation", "no-match", "other-exception"])
+def test_other_failures_match_between_sync_and_async(fake_sdk, recognizer):
+    fake_sdk(recognizer)
+    sync_result = get_pronunciation_score("audio.wav", "Hello.")
+    async_result = asyncio.run(get_pronunciation_score_async("audio.wav", "Hello."))
+
+    assert sync_result == async_result
+    assert sync_result["pronunciation"] == 0 and sync_result["error"]
@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+
+import main
+
+
+def post_analyze(mode: str):
+    async def call():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/analyze",
+                files={"audio": ("recording.webm", b"\x1aE\xdf\xa3", "audio/webm")},
+                data={"reference_text": "Hello world.", "mode": mode},
+            )
+
+    return asyncio.run(call())
+
+
+def test_analyze_rejects_unknown_mode(monkeypatch):
+    converted = []
+    monkeypatch.setattr(main, "convert_to_wav", lambda *args: converted.append(args) or True)
+
+    response = post_analyze("paragraph")
+
+    assert response.status_code == 400
+    assert "paragraph" in response.json()["detail"]
+    assert not converted
+
+
+def test_analyze_rejects_passage_over_duration_limit(monkeypatch):
+    graded = []
+    monkeypatch.setattr(main, "stream_convert_to_wav",
+                        lambda *args: {"duration_ms": main.MAX_PASSAGE_MS + 1, "silences": []})
+
+    async def grade(*args):
+        graded.append(args)
+
+    monkeypatch.setattr(main, "get_passage_score_async", grade)
+
+    response = post_analyze("passage")
+
+    assert response.status_code == 400
+    assert f"{main.MAX_PASSAGE_MS // 1000} seconds" in response.json()["detail"]
+    assert not graded
@@ -0,0 +1,293 @@
+import os
+import math
+import shutil
+import asyncio
+import threading
+import struct
+import wave
+
+import pytest
+
+from passage_engine import (
+    SEGMENT_MAX_MS,
+    MAX_SEGMENT_MS,
+    TICKS_PER_MS,
+    plan_segments,
+    split_long_sentence,
+    merge_segment_scores,
+    combine_results,
+    stream_convert_to_wav,
+    get_passage_score_async,
+)
+import passage_engine
+from grading_engine import APIError
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+
+def assert_covers(segments, duration_ms):
+    """Segments must be contiguous, cover the whole recording and stay under the utterance limit."""
+    assert segments[0]["start_ms"] == 0
+    assert segments[-1]["end_ms"] == duration_ms
+    for previous, current in zip(segments, segments[1:]):
+        assert previous["end_ms"] == current["start_ms"]
+    for segment in segments:
+        assert 0 < segment["end_ms"] - segment["start_ms"] <= MAX_SEGMENT_MS
+
+
+def test_one_segment_per_sentence():
+    sentences = ["aaaa bbbb."] * 10
+    segments = plan_segments(sentences, 100000, [])
+
+    assert [s["text"] for s in segments] == sentences
+    assert [s["end_ms"] for s in segments] == list(range(10000, 100001, 10000))
+
+
+def test_distant_silence_near_start_is_ignored():
+    segments = plan_segments(["aaaa bbbb."] * 10, 100000, [(500, 900)])
+
+    assert len(segments) == 10
+    assert_covers(segments, 100000)
+    assert segments[0]["end_ms"] == 10000
+
+
+def test_distant_silence_near_end_is_ignored():
+    segments = plan_segments(["aaaa bbbb."] * 10, 100000, [(99000, 99500)])
+
+    assert len(segments) == 10
+    assert_covers(segments, 100000)
+    assert min(s["end_ms"] - s["start_ms"] for s in segments) >= 9000
+
+
+def test_cut_snaps_to_nearby_silence():
+    segments = plan_segments(["aaaa bbbb."] * 3, 30000, [(10500, 11300)])
+
+    assert segments[0]["end_ms"] == 10900
+    assert segments[1]["start_ms"] == 10900
+    # The next estimate is re-anchored on the actual cut
+    assert segments[1]["end_ms"] == 20500
+
+
+def test_leading_and_trailing_silence_excluded_from_estimates():
+    segments = plan_segments(["aaaa bbbb."] * 2, 24000, [(0, 2000), (22000, 24000)])
+
+    assert segments[0]["end_ms"] == 12000
+    assert segments[-1]["end_ms"] == 24000
+
+
+def test_long_sentence_is_split_between_words():
+    sentence = " ".join(["word"] * 40) + "."
+    segments = plan_segments([sentence], 60000, [])
+
+    assert len(segments) == 7
+    assert " ".join(s["text"] for s in segments) == sentence
+    assert_covers(segments, 60000)
+
+
+def read_at_varying_pace(sentence_ms: list, pause_ms: int = 400):
+    """Silences and true sentence boundaries for sentences read back to back."""
+    silences = []
+    boundaries = []
+    position = 0
+    for length in sentence_ms[:-1]:
+        position += length
+        silences.append((position, position + pause_ms))
+        boundaries.append(position + pause_ms // 2)
+        position += pause_ms
+    return position + sentence_ms[-1], silences, boundaries
+
+
+def test_cuts_follow_sentences_when_pace_changes():
+    sentences = ["aaaa bbbb cccc dddd."] * 60
+    duration_ms, silences, boundaries = read_at_varying_pace([6000] * 30 + [4000] * 30)
+
+    segments = plan_segments(sentences, duration_ms, silences)
+
+    assert [s["end_ms"] for s in segments[:-1]] == boundaries
+    assert_covers(segments, duration_ms)
+
+
+def test_cuts_follow_sentences_with_irregular_pace_and_mid_sentence_pauses():
+    lengths = [4500, 6000, 5000, 6500, 4000, 5500, 6000, 4500, 5000, 6500]
+    sentences = ["aaaa bbbb cccc dddd."] * len(lengths)
+    duration_ms, silences, boundaries = read_at_varying_pace(lengths)
+    # A short breath in the middle of the longest sentences
+    breaths = [(start - length // 2, start - length // 2 + 300)
+               for (start, _), length in zip(silences, lengths) if length >= 6000]
+
+    segments = plan_segments(sentences, duration_ms, sorted(silences + breaths))
+
+    assert [s["end_ms"] for s in segments[:-1]] == boundaries
+
+
+def test_split_long_sentence_keeps_short_sentences_whole():
+    assert split_long_sentence("Short one.", ms_per_char=100) == ["Short one."]
+    assert split_long_sentence("Onewordonly.", ms_per_char=10000) == ["Onewordonly."]
+
+
+def scored(pronunciation, words, error=None):
+    result = {
+        "pronunciation": pronunciation,
+        "fluency": pronunciation,
+        "completeness": pronunciation,
+        "azure_debug": {
+            "recognized_text": " ".join(w["word"] for w in words),
+            "words": words,
+            "overall_metrics": {
+                "accuracy_score": pronunciation,
+                "fluency_score": pronunciation,
+                "completeness_score": pronunciation,
+                "pronunciation_score": pronunciation,
+            },
+        },
+    }
+    if error:
+        result = {"pronunciation": 0, "error": error}
+    return result
+
+
+def test_merge_shifts_word_offsets_and_weights_by_word_count():
+    segments = [
+        {"text": "one two three", "start_ms": 0, "end_ms": 4000},
+        {"text": "four", "start_ms": 4000, "end_ms": 6000},
+    ]
+    results = [
+        scored(80, [{"word": "one", "offset": 1000, "duration": 500}]),
+        scored(40, [{"word": "four", "offset": 2000, "duration": 500}]),
+    ]
+
+    merged = merge_segment_scores(segments, results, strictness=3)
+
+    assert merged["pronunciation"] == 70.0
+    assert merged["azure_debug"]["overall_metrics"]["fluency_score"] == 70.0
+    assert [w["offset"] for w in merged["azure_debug"]["words"]] == [1000, 4000 * TICKS_PER_MS + 2000]
+    assert merged["azure_debug"]["recognized_text"] == "one four"
+    assert results[1]["azure_debug"]["words"][0]["offset"] == 2000  # inputs are not mutated
+
+
+def test_merge_counts_unrecognized_segment_as_zero():
+    segments = [
+        {"text": "one two", "start_ms": 0, "end_ms": 4000},
+        {"text": "three four", "start_ms": 4000, "end_ms": 8000},
+    ]
+    results = [scored(90, []), scored(0, [], error="No speech recognized.")]
+
+    merged = merge_segment_scores(segments, results, strictness=3)
+
+    assert merged["pronunciation"] == 45.0
+    assert merged["segments"][1]["error"] == "No speech recognized."
+
+
+def test_combine_results_reports_error_when_nothing_was_graded():
+    segments = [{"text": "one", "start_ms": 0, "end_ms": 1000}]
+    results = [scored(0, [], error="No speech recognized.")]
+
+    assert combine_results(segments, results, strictness=3) == {"pronunciation": 0, "error": "No speech recognized."}
+
+
+def test_merge_keeps_mock_flag():
+    segments = [{"text": "one", "start_ms": 0, "end_ms": 1000}]
+    result = scored(85, [])
+    result.update({"mock_data": True, "details": "Running in mock mode"})
+
+    merged = merge_segment_scores(segments, [result], strictness=3)
+
+    assert merged["mock_data"] is True
+    assert merged["details"] == "Running in mock mode"
+
+
+def write_silent_wav(path, seconds):
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(b"\x00\x00" * 16000 * seconds)
+    return str(path)
+
+
+def test_passage_score_async_writes_segments_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.delenv("AZURE_SPEECH_KEY", raising=False)  # Mock grading
+    wav_path = write_silent_wav(tmp_path / "passage.wav", seconds=4)
+
+    threads = []
+    write_segments = passage_engine.write_segments
+
+    def record_thread(*args):
+        threads.append(threading.current_thread())
+        return write_segments(*args)
+
+    monkeypatch.setattr(passage_engine, "write_segments", record_thread)
+    conversion = {"duration_ms": 4000, "silences": []}
+    result = asyncio.run(get_passage_score_async(wav_path, conversion, "One two. Three four.", 3))
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert len(result["segments"]) == 2
+
+
+def test_passage_score_async_cancels_other_segments_on_api_error(tmp_path, monkeypatch):
+    wav_path = write_silent_wav(tmp_path / "passage.wav", seconds=4)
+    cancelled = []
+
+    async def grade(path, text, strictness):
+        if text.startswith("One"):
+            await asyncio.sleep(0.01)
+            raise APIError("Rate limited", "rate_limit")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(os.path.exists(path))
+            raise
+
+    monkeypatch.setattr(passage_engine, "get_pronunciation_score_async", grade)
+    conversion = {"duration_ms": 4000, "silences": []}
+
+    with pytest.raises(APIError):
+        asyncio.run(get_passage_score_async(wav_path, conversion, "One two. Three four. Five six.", 3))
+
+    # Both other segments were stopped while their files still existed
+    assert cancelled == [True, True]
+
+
+def write_tone_with_gap(path, rate=48000):
+    """1s tone, 1s silence, 1s tone."""
+    tone = [int(8000 * math.sin(2 * math.pi * 220 * i / rate)) for i in range(rate)]
+    samples = tone + [0] * rate + tone
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+
+
+@requires_ffmpeg
+def test_stream_convert_detects_silence(tmp_path):
+    source = str(tmp_path / "input.wav")
+    output = str(tmp_path / "output.wav")
+    write_tone_with_gap(source)
+
+    conversion = stream_convert_to_wav(source, output)
+
+    assert conversion["duration_ms"] == 3000
+    assert len(conversion["silences"]) == 1
+    start, end = conversion["silences"][0]
+    assert abs(start - 1000) <= 20 and abs(end - 2000) <= 20
+    with wave.open(output, "rb") as wav_file:
+        assert (wav_file.getframerate(), wav_file.getnchannels(), wav_file.getsampwidth()) == (16000, 1, 2)
+        assert wav_file.getnframes() == 48000
+
+
+@requires_ffmpeg
+def test_stream_convert_rejects_invalid_input(tmp_path):
+    source = tmp_path / "input.webm"
+    source.write_bytes(b"not audio" * 100000)
+
+    assert stream_convert_to_wav(str(source), str(tmp_path / "output.wav")) is None
+
+
+@requires_ffmpeg
+def test_stream_convert_gives_up_after_timeout(tmp_path, monkeypatch):
+    source = str(tmp_path / "input.wav")
+    write_tone_with_gap(source)
+    monkeypatch.setattr("passage_engine.CONVERT_TIMEOUT_SECONDS", 0)
+
+    assert stream_convert_to_wav(source, str(tmp_path / "output.wav")) is None
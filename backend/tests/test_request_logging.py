@@ -0,0 +1,139 @@
+import io
+import json
+import asyncio
+import time
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+# Imported before any fixture runs, so main's own configure_logging() at import
+# cannot replace the handlers a test has set up
+from main import RequestLoggingMiddleware, app as main_app
+import request_logging
+from request_logging import configure_logging, flush_logs, shutdown_logging, parse_sample_rates
+
+
+@pytest.fixture
+def log_stream(monkeypatch):
+    """Route logging to an in-memory stream and return a function reading the JSON records."""
+    monkeypatch.delenv("LOG_SAMPLE_RATES", raising=False)
+    stream = io.StringIO()
+    configure_logging(stream=stream)
+
+    def records():
+        flush_logs()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield records
+    shutdown_logging()
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("DEBUG=0, info=0.25,WARNING=7") == {
+        logging.DEBUG: 0.0,
+        logging.INFO: 0.25,
+        logging.WARNING: 1.0,
+    }
+
+
+def test_parse_sample_rates_skips_bad_entries(log_stream):
+    assert parse_sample_rates("INFO=half,LOUD=0.5,DEBUG=nan,,WARNING=0.5") == {logging.WARNING: 0.5}
+    warnings = [r["entry"] for r in log_stream() if r["message"] == "Ignoring invalid LOG_SAMPLE_RATES entry"]
+    assert warnings == ["INFO=half", "LOUD=0.5", "DEBUG=nan"]
+
+
+def test_bad_sample_rates_do_not_break_configuration(monkeypatch):
+    monkeypatch.setenv("LOG_SAMPLE_RATES", "INFO=half")
+    configure_logging(stream=io.StringIO())
+    shutdown_logging()
+
+
+def test_flush_returns_after_shutdown():
+    configure_logging(stream=io.StringIO())
+    shutdown_logging()
+    logging.getLogger("test").info("Queued with no listener")
+
+    start = time.perf_counter()
+    flush_logs(timeout=5)
+    assert time.perf_counter() - start < 1
+
+
+def test_flush_gives_up_after_timeout(log_stream, monkeypatch):
+    # A record that was enqueued but never marked done, as with a stuck listener
+    monkeypatch.setattr(request_logging._queue, "unfinished_tasks", 1)
+
+    start = time.perf_counter()
+    flush_logs(timeout=0.2)
+    assert time.perf_counter() - start < 1
+    monkeypatch.setattr(request_logging._queue, "unfinished_tasks", 0)
+
+
+def test_request_logged_when_handler_raises(log_stream):
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    async def call():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/boom", headers={"X-Request-ID": "req-1"})
+
+    response = asyncio.run(call())
+
+    assert response.status_code == 500
+    completed = [r for r in log_stream() if r["message"] == "Request completed"]
+    assert len(completed) == 1
+    assert completed[0]["status"] == 500
+    assert completed[0]["path"] == "/boom"
+    assert completed[0]["request_id"] == "req-1"
+
+
+def get(app, path, headers=None):
+    async def call():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(call())
+
+
+def test_request_id_header_and_status_logged(log_stream):
+    response = get(main_app, "/api/health")
+
+    assert response.status_code == 200
+    completed = [r for r in log_stream() if r["message"] == "Request completed"]
+    assert completed[0]["request_id"] == response.headers["X-Request-ID"]
+    assert completed[0]["status"] == 200
+
+
+@pytest.mark.parametrize("request_id", ["x" * 129, "req 1", "req\u2028id"])
+def test_invalid_request_id_header_replaced(log_stream, request_id):
+    response = get(main_app, "/api/health", headers={"X-Request-ID": request_id.encode("utf-8")})
+
+    assert response.headers["X-Request-ID"] != request_id
+    assert len(response.headers["X-Request-ID"]) == 32
+    completed = [r for r in log_stream() if r["message"] == "Request completed"]
+    assert completed[0]["request_id"] == response.headers["X-Request-ID"]
+
+
+def test_handler_fields_merged_into_single_record(log_stream):
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.get("/work")
+    async def work(request: Request):
+        request.state.log_fields = {"mode": "sentence", "stages_ms": {"convert": 1.5}}
+        return {}
+
+    get(app, "/work", headers={"X-Request-ID": "req-2"})
+
+    records = [r for r in log_stream() if r["logger"] == "main"]
+    assert [r["message"] for r in records] == ["Request completed"]
+    assert records[0]["mode"] == "sentence"
+    assert records[0]["stages_ms"] == {"convert": 1.5}
+    assert records[0]["request_id"] == "req-2"
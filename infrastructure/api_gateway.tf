@@ -6,7 +6,8 @@ resource "aws_apigatewayv2_api" "main" {
   cors_configuration {
     allow_origins     = ["https://${var.domain_name}", "http://localhost:5173"]
     allow_methods     = ["GET", "POST", "OPTIONS"]
-    allow_headers     = ["Content-Type", "Authorization"]
+    allow_headers     = ["Content-Type", "Authorization", "Range"]
+    expose_headers    = ["Content-Range", "Accept-Ranges", "Content-Length", "X-Request-ID"]
     allow_credentials = true
     max_age           = 3600
   }
@@ -56,6 +57,25 @@ resource "aws_apigatewayv2_route" "analyze" {
   authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
 }
 
+# Route: GET /api/attempts/{attempt_id}/audio (protected)
+# The backend only checks attempt ownership; the token itself is verified here
+resource "aws_apigatewayv2_route" "attempt_audio" {
+  api_id             = aws_apigatewayv2_api.main.id
+  route_key          = "GET /api/attempts/{attempt_id}/audio"
+  target             = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+  authorization_type = "JWT"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+}
+
+# Route: GET /api/attempts/{attempt_id}/words/{word_index} (protected)
+resource "aws_apigatewayv2_route" "attempt_word_audio" {
+  api_id             = aws_apigatewayv2_api.main.id
+  route_key          = "GET /api/attempts/{attempt_id}/words/{word_index}"
+  target             = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+  authorization_type = "JWT"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+}
+
 # Route: GET /api/health (public - for monitoring)
 resource "aws_apigatewayv2_route" "health" {
   api_id    = aws_apigatewayv2_api.main.id
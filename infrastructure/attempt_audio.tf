@@ -0,0 +1,49 @@
+# S3 bucket for recorded attempt audio (replayed via /api/attempts/*)
+resource "aws_s3_bucket" "attempt_audio" {
+  bucket = "${var.app_name}-attempt-audio-${var.environment}"
+
+  tags = {
+    Name = "${var.app_name}-attempt-audio-bucket"
+  }
+}
+
+# Private; the Lambda reads ranges itself and hands out short-lived presigned URLs
+resource "aws_s3_bucket_public_access_block" "attempt_audio" {
+  bucket = aws_s3_bucket.attempt_audio.id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+# Expire old attempts instead of evicting them in the backend
+resource "aws_s3_bucket_lifecycle_configuration" "attempt_audio" {
+  bucket = aws_s3_bucket.attempt_audio.id
+
+  rule {
+    id     = "expire-attempts"
+    status = "Enabled"
+
+    filter {
+      prefix = "attempts/"
+    }
+
+    expiration {
+      days = var.attempt_audio_retention_days
+    }
+  }
+}
+
+# Allow the frontend to follow presigned redirects and seek with Range
+resource "aws_s3_bucket_cors_configuration" "attempt_audio" {
+  bucket = aws_s3_bucket.attempt_audio.id
+
+  cors_rule {
+    allowed_origins = ["https://${var.domain_name}", "http://localhost:5173"]
+    allowed_methods = ["GET", "HEAD"]
+    allowed_headers = ["Range"]
+    expose_headers  = ["Content-Range", "Accept-Ranges", "Content-Length"]
+    max_age_seconds = 3600
+  }
+}
@@ -22,6 +22,23 @@ resource "aws_iam_role_policy_attachment" "lambda_basic" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+# Read/write access to stored attempt audio
+resource "aws_iam_role_policy" "lambda_attempt_audio" {
+  name = "${var.app_name}-lambda-attempt-audio"
+  role = aws_iam_role.lambda.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["s3:GetObject", "s3:PutObject"]
+        Resource = "${aws_s3_bucket.attempt_audio.arn}/attempts/*"
+      }
+    ]
+  })
+}
+
 # Lambda function
 resource "aws_lambda_function" "backend" {
   function_name = "${var.app_name}-api"
@@ -35,11 +52,13 @@ resource "aws_lambda_function" "backend" {
   timeout     = 60   # 60 seconds - audio analysis can take time
 
   # Environment variables
+  # Attempt audio lives in S3 because /tmp is private to each container
   environment {
     variables = {
-      AZURE_SPEECH_KEY    = var.azure_speech_key
-      AZURE_SPEECH_REGION = var.azure_speech_region
-      OPENAI_API_KEY      = var.openai_api_key
+      AZURE_SPEECH_KEY     = var.azure_speech_key
+      AZURE_SPEECH_REGION  = var.azure_speech_region
+      OPENAI_API_KEY       = var.openai_api_key
+      ATTEMPT_AUDIO_BUCKET = aws_s3_bucket.attempt_audio.id
     }
   }
 
@@ -153,7 +153,7 @@ resource "aws_cloudfront_distribution" "frontend" {
     # Forward all headers for API requests (including Authorization)
     forwarded_values {
       query_string = true
-      headers      = ["Authorization", "Content-Type", "Origin", "Accept"]
+      headers      = ["Authorization", "Content-Type", "Origin", "Accept", "Range"]
       cookies {
         forward = "all"
       }
@@ -51,3 +51,9 @@ variable "cognito_users" {
   default     = []
 }
 
+
+variable "attempt_audio_retention_days" {
+  description = "Days to keep recorded attempt audio before S3 deletes it"
+  type        = number
+  default     = 7
+}